@@ -0,0 +1,79 @@
+import numpy as np
+
+# AES S-box, pre-defined everywhere
+SBOX = np.array((
+    0x63, 0x7C, 0x77, 0x7B, 0xF2, 0x6B, 0x6F, 0xC5, 0x30, 0x01, 0x67, 0x2B, 0xFE, 0xD7, 0xAB, 0x76,
+    0xCA, 0x82, 0xC9, 0x7D, 0xFA, 0x59, 0x47, 0xF0, 0xAD, 0xD4, 0xA2, 0xAF, 0x9C, 0xA4, 0x72, 0xC0,
+    0xB7, 0xFD, 0x93, 0x26, 0x36, 0x3F, 0xF7, 0xCC, 0x34, 0xA5, 0xE5, 0xF1, 0x71, 0xD8, 0x31, 0x15,
+    0x04, 0xC7, 0x23, 0xC3, 0x18, 0x96, 0x05, 0x9A, 0x07, 0x12, 0x80, 0xE2, 0xEB, 0x27, 0xB2, 0x75,
+    0x09, 0x83, 0x2C, 0x1A, 0x1B, 0x6E, 0x5A, 0xA0, 0x52, 0x3B, 0xD6, 0xB3, 0x29, 0xE3, 0x2F, 0x84,
+    0x53, 0xD1, 0x00, 0xED, 0x20, 0xFC, 0xB1, 0x5B, 0x6A, 0xCB, 0xBE, 0x39, 0x4A, 0x4C, 0x58, 0xCF,
+    0xD0, 0xEF, 0xAA, 0xFB, 0x43, 0x4D, 0x33, 0x85, 0x45, 0xF9, 0x02, 0x7F, 0x50, 0x3C, 0x9F, 0xA8,
+    0x51, 0xA3, 0x40, 0x8F, 0x92, 0x9D, 0x38, 0xF5, 0xBC, 0xB6, 0xDA, 0x21, 0x10, 0xFF, 0xF3, 0xD2,
+    0xCD, 0x0C, 0x13, 0xEC, 0x5F, 0x97, 0x44, 0x17, 0xC4, 0xA7, 0x7E, 0x3D, 0x64, 0x5D, 0x19, 0x73,
+    0x60, 0x81, 0x4F, 0xDC, 0x22, 0x2A, 0x90, 0x88, 0x46, 0xEE, 0xB8, 0x14, 0xDE, 0x5E, 0x0B, 0xDB,
+    0xE0, 0x32, 0x3A, 0x0A, 0x49, 0x06, 0x24, 0x5C, 0xC2, 0xD3, 0xAC, 0x62, 0x91, 0x95, 0xE4, 0x79,
+    0xE7, 0xC8, 0x37, 0x6D, 0x8D, 0xD5, 0x4E, 0xA9, 0x6C, 0x56, 0xF4, 0xEA, 0x65, 0x7A, 0xAE, 0x08,
+    0xBA, 0x78, 0x25, 0x2E, 0x1C, 0xA6, 0xB4, 0xC6, 0xE8, 0xDD, 0x74, 0x1F, 0x4B, 0xBD, 0x8B, 0x8A,
+    0x70, 0x3E, 0xB5, 0x66, 0x48, 0x03, 0xF6, 0x0E, 0x61, 0x35, 0x57, 0xB9, 0x86, 0xC1, 0x1D, 0x9E,
+    0xE1, 0xF8, 0x98, 0x11, 0x69, 0xD9, 0x8E, 0x94, 0x9B, 0x1E, 0x87, 0xE9, 0xCE, 0x55, 0x28, 0xDF,
+    0x8C, 0xA1, 0x89, 0x0D, 0xBF, 0xE6, 0x42, 0x68, 0x41, 0x99, 0x2D, 0x0F, 0xB0, 0x54, 0xBB, 0x16,
+), dtype=np.uint8)
+
+INV_SBOX = np.argsort(SBOX).astype(np.uint8)
+
+RCON = np.array([0x01, 0x02, 0x04, 0x08, 0x10, 0x20, 0x40, 0x80, 0x1B, 0x36], dtype=np.uint8)
+ROUNDS = 10
+
+# The state is column-major (byte i is row i % 4, column i // 4). After ShiftRows, byte i holds what was
+# at SHIFT_ROWS[i] before it.
+SHIFT_ROWS = np.array([(i % 4) + 4 * ((i // 4 + i % 4) % 4) for i in range(16)])
+
+# Multiplication by 2 in GF(2^8)
+XTIME = np.array([((value << 1) ^ (0x1B if value & 0x80 else 0)) & 0xFF for value in range(256)], dtype=np.uint8)
+
+
+def expand_key(keys):
+    """ AES-128 key schedule for a batch of keys: (M, 16) uint8 -> (M, 11, 16) round keys. """
+    keys = np.atleast_2d(np.asarray(keys, dtype=np.uint8))
+    words = [keys[:, 4 * i:4 * i + 4] for i in range(4)]
+    for i in range(4, 4 * (ROUNDS + 1)):
+        temp = words[i - 1]
+        if i % 4 == 0:
+            temp = SBOX[np.roll(temp, -1, axis=1)]
+            temp[:, 0] ^= RCON[i // 4 - 1]
+        words.append(words[i - 4] ^ temp)
+    return np.concatenate(words, axis=1).reshape(len(keys), ROUNDS + 1, 16)
+
+
+def invert_key_schedule(round_key, round_number=ROUNDS):
+    """ Walk the AES-128 key schedule backwards from one round key to the master key. """
+    words = [np.array(round_key[4 * i:4 * i + 4], dtype=np.uint8) for i in range(4)]
+    for i in range(4 * round_number - 1, -1, -1):
+        # words holds w[i+1] .. w[i+4]; recover w[i] = w[i+4] ^ f(w[i+3])
+        temp = words[2]
+        if (i + 4) % 4 == 0:
+            temp = SBOX[np.roll(temp, -1)]
+            temp[0] ^= RCON[(i + 4) // 4 - 1]
+        words = [words[3] ^ temp] + words[:3]
+    return np.concatenate(words)
+
+
+def mix_columns(state):
+    """ MixColumns on a batch of (M, 16) states. """
+    columns = state.reshape(-1, 4, 4)
+    rotated = np.roll(columns, -1, axis=2)
+    total = columns[:, :, 0] ^ columns[:, :, 1] ^ columns[:, :, 2] ^ columns[:, :, 3]
+    return (columns ^ total[:, :, None] ^ XTIME[columns ^ rotated]).reshape(-1, 16)
+
+
+def encrypt(round_keys, plaintext):
+    """ Encrypt a batch of blocks. round_keys is (M, 11, 16) from expand_key and plaintext is (M, 16) or a
+    single (16,) block shared by every key. """
+    state = np.broadcast_to(np.asarray(plaintext, dtype=np.uint8), (len(round_keys), 16)) ^ round_keys[:, 0]
+    for round_number in range(1, ROUNDS + 1):
+        state = SBOX[state][:, SHIFT_ROWS]
+        if round_number != ROUNDS:
+            state = mix_columns(state)
+        state = state ^ round_keys[:, round_number]
+    return state
@@ -0,0 +1,65 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from checkpoint import Checkpoint
+from streaming import run_streaming
+from synth import generate
+from traces import iter_traces
+
+
+def streaming_run(path, chunk_size, directory=None):
+    """ One streaming attack, resumed from and saved to a checkpoint in directory when given.
+    Returns the recovered key, seconds taken and the traces read from the source. """
+    start = time.perf_counter()
+    cpa, store, begin = None, None, 0
+    if directory:
+        store = Checkpoint(directory, path, {'attack': 'first'}, interval=float('inf'))
+        cpa = store.load()
+        begin = cpa.n_traces if cpa is not None else 0
+    cpa, stopping = run_streaming(iter_traces(path, chunk_size, begin), cpa=cpa, checkpoint=store)
+    if store is not None:
+        store.finish(cpa)
+    key = np.argmax(cpa.max_correlations(), axis=1)
+    return key, time.perf_counter() - start, cpa.n_traces - begin
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time saved by resuming a streaming CPA from a checkpoint.")
+    parser.add_argument("-n", "--traces", type=int, default=50000, help="Traces in the first capture.")
+    parser.add_argument("--appended", type=int, default=10000, help="Traces appended to it afterwards.")
+    parser.add_argument("-s", "--samples", type=int, default=1000)
+    parser.add_argument("--format", choices=['csv', 'traces'], default='csv')
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # Same seed and chunk size, so the longer capture starts with exactly the traces of the shorter one
+        first = os.path.join(workdir, 'first.' + args.format)
+        grown = os.path.join(workdir, 'grown.' + args.format)
+        params = dict(n_samples=args.samples, snr=0.05)
+        key = generate(first, args.traces, args.chunk_size, **params).key
+        generate(grown, args.traces + args.appended, args.chunk_size, **params)
+        directory = os.path.join(workdir, 'checkpoints')
+        print(f"{args.traces} + {args.appended} traces x {args.samples} samples ({args.format})")
+        print(f"{'run':<36}{'traces read':>12}{'seconds':>9}{'key':>7}")
+
+        def report(name, result):
+            recovered, seconds, read = result
+            print(f"{name:<36}{read:>12}{seconds:>9.2f}{int((recovered == key).sum()):>4}/16")
+            return seconds
+
+        report("first capture, saving checkpoint", streaming_run(first, args.chunk_size, directory))
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        rerun = report("same capture, resumed", streaming_run(first, args.chunk_size, directory))
+        cold = report("grown capture, from scratch", streaming_run(grown, args.chunk_size))
+        resumed = report("grown capture, resumed", streaming_run(grown, args.chunk_size, directory))
+        print(f"Checkpoint {size / 2**20:.0f} MiB; resuming the grown capture saved {cold - resumed:.2f}s "
+              f"({cold / resumed:.1f}x), re-running an unchanged capture takes {rerun:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
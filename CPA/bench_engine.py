@@ -0,0 +1,60 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import scipy.stats
+
+from aes import SBOX
+from engine import attack_byte, standardize
+from leakage import hw
+from traces import read_waveform_csv
+
+
+def legacy_attack_byte(waveformFile, keyIndex):
+    """ The original per-guess, per-sample pearsonr loop, kept for comparison (guesses 0x00-0xFE and
+    samples 1..S-2 only, exactly as before). """
+    no_of_traces = waveformFile.shape[0]
+    plaintextRow = waveformFile.iloc[:, 0]
+    powerTraceData = waveformFile.iloc[:, 2:]
+    possibleKey = 255
+    plainTextBytes = [int(plaintextRow[index][2 * keyIndex:2 * keyIndex + 2], 16) for index in range(no_of_traces)]
+    maxCorrelation = []
+    for k in range(possibleKey):
+        hypothesis = [hw(SBOX[plainTextBytes[t] ^ k]) for t in range(no_of_traces)]
+        correlation_values = [scipy.stats.pearsonr(hypothesis, powerTraceData.iloc[:, x])[0]
+                              for x in range(1, powerTraceData.shape[1] - 1)]
+        maxCorrelation.append(max(max(correlation_values), abs(min(correlation_values))))
+    return maxCorrelation.index(max(maxCorrelation))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the matrix CPA engine with the original pearsonr loop.")
+    parser.add_argument("waveform", nargs='?', default="waveform.csv")
+    parser.add_argument("--legacy-bytes", type=int, default=1,
+                        help="Key bytes to run through the original loop (it takes minutes per byte).")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    plaintext, ciphertext, samples = read_waveform_csv(args.waveform)
+    standardized = standardize(samples, axis=0)
+    key = [int(np.argmax(attack_byte(plaintext[:, b], standardized)[1])) for b in range(plaintext.shape[1])]
+    matrix_time = time.perf_counter() - start
+    print(f"Matrix engine: {matrix_time:.3f}s for {plaintext.shape[1]} bytes, "
+          f"{samples.shape[0]} traces x {samples.shape[1]} samples")
+    print("Key: " + " ".join(hex(k) for k in key))
+
+    if args.legacy_bytes > 0:
+        waveformFile = pd.read_csv(args.waveform, index_col=None, header=None)
+        start = time.perf_counter()
+        legacy_key = [legacy_attack_byte(waveformFile, b) for b in range(args.legacy_bytes)]
+        legacy_time = time.perf_counter() - start
+        estimate = legacy_time / args.legacy_bytes * plaintext.shape[1]
+        print(f"Original loop: {legacy_time:.1f}s for {args.legacy_bytes} byte(s), ~{estimate:.0f}s estimated "
+              f"for the full key ({estimate / matrix_time:.0f}x slower)")
+        match = legacy_key == key[:args.legacy_bytes]
+        print("Recovered bytes " + ("match" if match else "differ") + ": " + " ".join(hex(k) for k in legacy_key))
+
+
+if __name__ == "__main__":
+    main()
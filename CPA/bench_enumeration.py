@@ -0,0 +1,39 @@
+import argparse
+
+import numpy as np
+
+from engine import attack_byte, standardize
+from enumeration import byte_scores, search_key
+from metrics import key_ranks
+from traces import load_traces
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Key enumeration rate and rank of the true key on trace subsets "
+                                                 "too small for plain CPA.")
+    parser.add_argument("waveform", nargs='?', default="waveform.csv")
+    parser.add_argument("--key", default="key.txt", help="Known key of the waveform file.")
+    parser.add_argument("--traces", type=int, nargs='+', default=[50, 60, 70, 80, 90, 110],
+                        help="Subset sizes (first N traces) to attack.")
+    parser.add_argument("--budget", type=int, default=1 << 20, help="Keys enumerated at most per subset.")
+    args = parser.parse_args()
+
+    plaintext, ciphertext, samples = load_traces(args.waveform)
+    with open(args.key) as keyFile:
+        key = np.array([int(k, 16) for k in keyFile.read().split()], dtype=np.uint8)
+    print(f"{'traces':>7}{'bytes top-1':>13}{'worst byte rank':>17}{'key rank':>10}{'enumerated':>12}"
+          f"{'seconds':>9}{'keys/s':>10}")
+    for n in args.traces:
+        standardized = standardize(samples[:n], axis=0)
+        maxCorrelations = np.stack([attack_byte(plaintext[:n, b], standardized)[1] for b in range(plaintext.shape[1])])
+        ranks = key_ranks(maxCorrelations, key)
+        found, rank, enumerated, seconds = search_key(byte_scores(maxCorrelations), plaintext[:2], ciphertext[:2],
+                                                      args.budget)
+        if found is not None and not (found == key).all():
+            raise SystemExit(f"Enumeration verified a key different from {args.key}")
+        print(f"{n:>7}{int((ranks == 0).sum()):>10}/16{int(ranks.max()) + 1:>17}{rank or 'not found':>10}"
+              f"{enumerated:>12}{seconds:>9.2f}{enumerated / max(seconds, 1e-9):>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import argparse
+import time
+
+import numpy as np
+
+from engine import attack_byte, standardize
+from lastround import last_round_correlations, last_round_key
+from synth import capture
+from traces import load_traces
+
+
+def first_round_key(plaintext, ciphertext, samples):
+    standardized = standardize(samples, axis=0)
+    return np.array([np.argmax(attack_byte(plaintext[:, b], standardized)[1]) for b in range(16)])
+
+
+def last_round_recovered(plaintext, ciphertext, samples):
+    return np.argmax(last_round_correlations(ciphertext, standardize(samples, axis=0)), axis=1)
+
+
+def traces_to_success(attack, expected, plaintext, ciphertext, samples, steps):
+    """ Smallest trace count in steps from which every byte is recovered (and stays recovered). """
+    success = None
+    for n in steps:
+        if (attack(plaintext[:n], ciphertext[:n], samples[:n]) == expected).all():
+            success = success or n
+        else:
+            success = None
+    return success
+
+
+def report(name, key, plaintext, ciphertext, samples, steps):
+    for label, attack, expected in (('first round', first_round_key, key),
+                                    ('last round', last_round_recovered, last_round_key(key))):
+        start = time.perf_counter()
+        recovered = attack(plaintext, ciphertext, samples)
+        elapsed = time.perf_counter() - start
+        needed = traces_to_success(attack, expected, plaintext, ciphertext, samples, steps)
+        print(f"{name:<12}{label:<13}{elapsed:>9.3f}s{int((recovered == expected).sum()):>8}/16"
+              f"{needed if needed else 'not reached':>14}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="First-round vs last-round CPA runtime and traces to success.")
+    parser.add_argument("--waveform", default="waveform.csv")
+    parser.add_argument("--key", default="key.txt", help="Known key of the waveform file.")
+    parser.add_argument("-n", "--traces", type=int, default=5000, help="Synthetic traces.")
+    parser.add_argument("--snr", type=float, default=0.125, help="Synthetic leakage to noise variance ratio.")
+    args = parser.parse_args()
+
+    print(f"{'capture':<12}{'attack':<13}{'runtime':>10}{'bytes':>11}{'traces needed':>14}")
+    plaintext, ciphertext, samples = load_traces(args.waveform)
+    with open(args.key) as keyFile:
+        key = np.array([int(k, 16) for k in keyFile.read().split()], dtype=np.uint8)
+    report('waveform', key, plaintext, ciphertext, samples, range(10, len(samples) + 1, 10))
+
+    synthetic, plaintext, ciphertext, samples = capture(args.traces, n_samples=400, snr=args.snr, last_round=True)
+    key = synthetic.key
+    report('synthetic', key, plaintext, ciphertext, samples, range(100, args.traces + 1, 100))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import os
+
+# One BLAS thread per process, so the scaling comes from the process pool alone
+for variable in ('OPENBLAS_NUM_THREADS', 'OMP_NUM_THREADS', 'MKL_NUM_THREADS'):
+    os.environ.setdefault(variable, '1')
+
+import argparse
+import time
+
+import numpy as np
+
+from engine import attack_byte, standardize
+from parallel import parallel_correlations
+from synth import capture
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling of the parallel CPA mode from 1 to N processes.")
+    parser.add_argument("-n", "--traces", type=int, default=20000)
+    parser.add_argument("-s", "--samples", type=int, default=5000)
+    parser.add_argument("--max-jobs", type=int, default=os.cpu_count())
+    parser.add_argument("--tile-samples", type=int, help="Also split bytes into sample tiles.")
+    args = parser.parse_args()
+
+    synthetic, plaintext, ciphertext, samples = capture(args.traces, 2000, n_samples=args.samples)
+    print(f"{args.traces} traces x {args.samples} samples, {os.cpu_count()} CPUs")
+
+    start = time.perf_counter()
+    standardized = standardize(samples, axis=0)
+    serial = np.stack([attack_byte(plaintext[:, b], standardized)[1] for b in range(16)])
+    serial_time = time.perf_counter() - start
+    del standardized
+    print(f"{'jobs':>5}{'seconds':>10}{'speed-up':>10}  identical")
+    print(f"{'serial':>5}{serial_time:>10.2f}{1:>10.2f}")
+
+    for jobs in range(1, args.max_jobs + 1):
+        start = time.perf_counter()
+        result = parallel_correlations(plaintext, samples, jobs, args.tile_samples)[0]
+        elapsed = time.perf_counter() - start
+        print(f"{jobs:>5}{elapsed:>10.2f}{serial_time / elapsed:>10.2f}  {np.array_equal(result, serial)}")
+
+
+if __name__ == "__main__":
+    main()
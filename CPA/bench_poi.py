@@ -0,0 +1,63 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from engine import attack_byte, standardize
+from poi import POI_METHODS, find_windows, windowed_correlations
+from synth import generate
+from traces import load_traces
+
+
+def full_attack(plaintext, samples):
+    standardized = standardize(samples, axis=0)
+    return np.array([np.argmax(attack_byte(plaintext[:, b], standardized)[1]) for b in range(16)])
+
+
+def compare(name, path, subset):
+    plaintext, ciphertext, samples = load_traces(path)
+    start = time.perf_counter()
+    key = full_attack(plaintext, samples)
+    full_time = time.perf_counter() - start
+    print(f"{name}: {samples.shape[0]} traces x {samples.shape[1]} samples, full CPA {full_time:.2f}s")
+    for method in POI_METHODS:
+        if os.path.exists(path + '.poi.json'):
+            os.remove(path + '.poi.json')
+        start = time.perf_counter()
+        windows = find_windows(path, plaintext, samples, method, subset)
+        found = time.perf_counter() - start
+        poi_key = np.argmax(windowed_correlations(plaintext, samples, windows)[0], axis=1)
+        total = time.perf_counter() - start
+        start = time.perf_counter()
+        cached = find_windows(path, plaintext, samples, method, subset)
+        np.argmax(windowed_correlations(plaintext, samples, cached)[0], axis=1)
+        cached_time = time.perf_counter() - start
+        width = np.mean([sum(stop - start for start, stop in w) for w in windows])
+        print(f"  {method:<5} windows {found:6.2f}s, total {total:6.2f}s ({full_time / total:5.1f}x), "
+              f"cached {cached_time:6.3f}s ({full_time / cached_time:6.1f}x), {width:5.0f} samples/byte, "
+              f"{int((poi_key == key).sum()):2}/16 bytes match full CPA")
+        os.remove(path + '.poi.json')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Speed-up and key parity of POI-restricted CPA.")
+    parser.add_argument("--waveform", default="waveform.csv")
+    parser.add_argument("-n", "--traces", type=int, default=20000)
+    parser.add_argument("-s", "--samples", type=int, default=5000)
+    parser.add_argument("--snr", type=float, default=0.5, help="Synthetic leakage to noise variance ratio.")
+    parser.add_argument("--poi-traces", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        waveform = os.path.join(workdir, os.path.basename(args.waveform))
+        os.symlink(os.path.abspath(args.waveform), waveform)
+        compare('waveform', waveform, args.poi_traces)
+        synthetic = os.path.join(workdir, 'synthetic.traces')
+        generate(synthetic, args.traces, n_samples=args.samples, snr=args.snr)
+        compare('synthetic', synthetic, args.poi_traces)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from preprocess import Align, Decimate, LowPass, MovingAverage, Pipeline, WindowSum
+from streaming import IncrementalCPA
+from synth import generate
+from traces import TraceFile
+
+CONFIGS = {
+    'raw': lambda: [],
+    'movavg': lambda: [MovingAverage(8)],
+    'align': lambda: [Align(40)],
+    'align+lowpass': lambda: [Align(40), LowPass(0.1)],
+    'align+movavg+decimate': lambda: [Align(40), MovingAverage(8), Decimate(4)],
+    'align+winsum': lambda: [Align(40), WindowSum(8)],
+}
+
+
+def traces_to_disclosure(path, key, step):
+    """ Smallest multiple of step from which the whole key ranks first (and stays first). """
+    traces = TraceFile(path)
+    cpa = IncrementalCPA()
+    disclosed = None
+    for plaintext, ciphertext, samples in traces.iter_chunks(step):
+        cpa.update(plaintext, samples)
+        if (np.argmax(cpa.max_correlations(), axis=1) == key).all():
+            disclosed = disclosed or cpa.n_traces
+        else:
+            disclosed = None
+    return disclosed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage preprocessing cost and traces to disclosure on jittered traces.")
+    parser.add_argument("-n", "--traces", type=int, default=20000)
+    parser.add_argument("--samples", type=int, default=1000)
+    parser.add_argument("--jitter", type=int, default=20, help="Largest random shift in samples.")
+    parser.add_argument("--snr", type=float, default=0.03, help="Leakage to noise variance ratio.")
+    parser.add_argument("--step", type=int, default=250, help="Trace count resolution of traces to disclosure.")
+    parser.add_argument("--config", action="append", choices=list(CONFIGS), help="Pipelines to run (default all).")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'raw.traces')
+        key = generate(source, args.traces, n_samples=args.samples, snr=args.snr, jitter=args.jitter).key
+        print(f"{args.traces} traces x {args.samples} samples, jitter +-{args.jitter}, SNR {args.snr}")
+        print(f"{'pipeline':<24}{'samples':>8}{'total':>9}  {'stage timings':<52}{'disclosure':>11}")
+        for name in args.config or CONFIGS:
+            pipeline = Pipeline(CONFIGS[name]())
+            output = os.path.join(directory, 'processed.traces')
+            start = time.perf_counter()
+            n_traces, n_samples = pipeline.run(source, output)
+            elapsed = time.perf_counter() - start
+            stages = " ".join(f"{stage}={seconds:.2f}s" for stage, seconds in pipeline.timings.items())
+            needed = traces_to_disclosure(output, key, args.step)
+            print(f"{name:<24}{n_samples:>8}{elapsed:>8.2f}s  {stages or '-':<52}{needed or 'not reached':>11}")
+            os.remove(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from leakage import MODELS, get_model
+from metrics import RANK_ENGINES, guessing_entropy, rank_experiments, success_rate
+from profiling import peak_rss_mib
+from traces import load_traces
+
+DEFAULT_CONFIGS = ['incremental:hw_sbox', 'batch:hw_sbox']
+
+
+def read_key(path):
+    with open(path) as keyFile:
+        return np.array([int(k, 16) for k in keyFile.read().split()], dtype=np.uint8)
+
+
+def trace_steps(n_traces, step, max_traces=None):
+    n_traces = min(n_traces, max_traces or n_traces)
+    return list(range(step, n_traces + 1, step)) or [n_traces]
+
+
+def parse_config(spec):
+    engine, _, model = spec.partition(':')
+    model = model or 'hw_sbox'
+    if engine not in RANK_ENGINES or model not in MODELS:
+        raise argparse.ArgumentTypeError("Expected ENGINE[:MODEL] with ENGINE in {engines} and MODEL in {models}."
+                                         .format(engines=", ".join(RANK_ENGINES), models=", ".join(MODELS)))
+    return engine + ':' + model
+
+
+def measure(config, args):
+    """ Run one engine configuration and return its timings, peak RSS and rank statistics. """
+    engine, model = config.split(':')
+    plaintext, ciphertext, samples = load_traces(args.waveform)
+    key = read_key(args.key)
+    steps = trace_steps(len(samples), args.step, args.max_traces)
+    start = time.perf_counter()
+    ranks = rank_experiments(plaintext, samples, key, steps, args.experiments, engine, get_model(model), args.seed)
+    elapsed = time.perf_counter() - start
+    rates = success_rate(ranks)
+    reached = [n for n, rate in zip(steps, rates) if rate >= args.target]
+    return {
+        'config': config, 'engine': engine, 'model': model,
+        'wall_s': elapsed, 'traces_per_s': args.experiments * steps[-1] / elapsed, 'peak_rss_mib': peak_rss_mib(),
+        'traces': steps, 'guessing_entropy': guessing_entropy(ranks).tolist(), 'success_rate': rates.tolist(),
+        'traces_to_target': reached[0] if reached else None,
+    }
+
+
+def run_measure(config, argv):
+    """ Measure a configuration in a fresh interpreter so peak memory is not shared between configurations. """
+    output = subprocess.run([sys.executable, __file__, *argv, '--measure', config],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Guessing entropy and success rate against the number of traces, "
+                                                 "with runtime and memory per engine configuration.")
+    parser.add_argument("waveform", nargs='?', default="waveform.csv", help="Waveform CSV or binary trace file.")
+    parser.add_argument("--key", default="key.txt", help="Known key of the traces.")
+    parser.add_argument("--config", action="append", type=parse_config,
+                        help="ENGINE[:MODEL] to run, repeatable (default: {configs}).".format(
+                            configs=", ".join(DEFAULT_CONFIGS)))
+    parser.add_argument("--experiments", type=int, default=20, help="Random trace orders per configuration.")
+    parser.add_argument("--step", type=int, default=10, help="Trace count between rank evaluations.")
+    parser.add_argument("--max-traces", type=int, help="Largest subset size (default all traces).")
+    parser.add_argument("--target", type=float, default=0.9, help="Success rate reported as traces to target.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default="bench_rank.json", help="Where to write the machine-readable results.")
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args)))
+        return
+
+    argv = [args.waveform, '--key', args.key, '--experiments', str(args.experiments), '--step', str(args.step),
+            '--target', str(args.target), '--seed', str(args.seed)]
+    if args.max_traces:
+        argv += ['--max-traces', str(args.max_traces)]
+    results = []
+    print(f"{'config':<24}{'wall s':>9}{'traces/s':>11}{'peak MiB':>10}{'final GE':>10}{'final SR':>10}"
+          f"{'SR>=' + str(args.target):>10}")
+    for config in args.config or DEFAULT_CONFIGS:
+        result = run_measure(config, argv)
+        results.append(result)
+        print(f"{config:<24}{result['wall_s']:>9.2f}{result['traces_per_s']:>11.0f}{result['peak_rss_mib']:>10.0f}"
+              f"{result['guessing_entropy'][-1]:>10.2f}{result['success_rate'][-1]:>10.2f}"
+              f"{result['traces_to_target'] or '-':>10}")
+    report = {'waveform': args.waveform, 'experiments': args.experiments, 'step': args.step, 'seed': args.seed,
+              'python': platform.python_version(), 'numpy': np.__version__, 'results': results}
+    with open(args.json, 'w') as reportFile:
+        json.dump(report, reportFile, indent=2)
+    print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
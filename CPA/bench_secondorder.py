@@ -0,0 +1,48 @@
+import argparse
+import time
+
+import numpy as np
+
+from engine import attack_byte, standardize
+from secondorder import PAIR_BLOCK, second_order_byte
+from synth import capture
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Second-order CPA runtime against window size on masked traces.")
+    parser.add_argument("-n", "--traces", type=int, default=20000)
+    parser.add_argument("-s", "--samples", type=int, default=1000)
+    parser.add_argument("--snr", type=float, default=1.0, help="Leakage to noise variance ratio.")
+    parser.add_argument("--widths", type=int, nargs='+', default=[16, 32, 64, 128, 256],
+                        help="Window sizes, each centered on byte 0's mask and masked S-box leakage.")
+    parser.add_argument("--pair-block", type=int, default=PAIR_BLOCK)
+    args = parser.parse_args()
+
+    synthetic, plaintext, ciphertext, samples = capture(args.traces, n_samples=args.samples, snr=args.snr,
+                                                       masked=True)
+    key = synthetic.key
+    standardized = standardize(samples, axis=0)
+    firstOrder = np.array([np.argmax(attack_byte(plaintext[:, b], standardized)[1]) for b in range(16)])
+    del standardized
+    print(f"{args.traces} masked traces x {args.samples} samples, SNR {args.snr}: "
+          f"first-order CPA recovers {int((firstOrder == key).sum())}/16 bytes")
+
+    # Byte 0's mask leaks mask_distance samples before its masked S-box output
+    center = synthetic.positions[0] - synthetic.mask_distance // 2
+    print(f"{'width':>6}{'pairs':>9}{'seconds':>9}{'pairs x traces/s':>18}{'byte 0':>8}{'corr':>7}{'margin':>8}")
+    for width in args.widths:
+        start = max(center - width // 2, 0)
+        window = (start, min(start + width, args.samples))
+        began = time.perf_counter()
+        best, pairs = second_order_byte(plaintext[:, 0], samples, window, pair_block=args.pair_block)
+        best = best[0]
+        elapsed = time.perf_counter() - began
+        n_pairs = (window[1] - window[0]) * (window[1] - window[0] - 1) // 2
+        ranked = np.sort(best)
+        found = "ok" if np.argmax(best) == key[0] else "wrong"
+        print(f"{width:>6}{n_pairs:>9}{elapsed:>9.2f}{n_pairs * args.traces / elapsed:>18.3g}{found:>8}"
+              f"{ranked[-1]:>7.3f}{ranked[-1] / ranked[-2]:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
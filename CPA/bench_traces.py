@@ -0,0 +1,82 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from profiling import peak_rss_mib
+from synth import generate
+from traces import convert_csv, iter_traces, load_traces
+
+
+def measure(mode, path, chunk_size):
+    """ Load (and touch) the traces one way and return timings and peak RSS of this process. """
+    start = time.perf_counter()
+    if mode == 'baseline':
+        loaded = checksum = 0.0
+    elif mode == 'load':
+        plaintext, ciphertext, samples = load_traces(path)
+        loaded = time.perf_counter() - start
+        checksum = float(np.asarray(samples, dtype=np.float64).sum(axis=0).sum())
+    else:
+        loaded = 0.0
+        checksum = 0.0
+        for plaintext, ciphertext, samples in iter_traces(path, chunk_size):
+            checksum += float(np.asarray(samples, dtype=np.float64).sum())
+    total = time.perf_counter() - start
+    return {'load_s': loaded, 'full_pass_s': total, 'peak_rss_mib': peak_rss_mib(), 'checksum': checksum}
+
+
+def run_measure(mode, path, chunk_size):
+    output = subprocess.run([sys.executable, __file__, '--measure', mode, path, '--chunk-size', str(chunk_size)],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark waveform CSV against binary trace store loading.")
+    parser.add_argument("-n", "--traces", type=int, default=20000)
+    parser.add_argument("-s", "--samples", type=int, default=2500)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--measure", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure[0], args.measure[1], args.chunk_size)))
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        run_benchmark(workdir, args)
+
+
+def run_benchmark(workdir, args):
+    csv_path = os.path.join(workdir, "synthetic.csv")
+    start = time.perf_counter()
+    generate(csv_path, args.traces, args.chunk_size, n_samples=args.samples)
+    print(f"Synthetic capture: {args.traces} traces x {args.samples} samples, "
+          f"{os.path.getsize(csv_path) / 2**20:.0f} MiB CSV ({time.perf_counter() - start:.1f}s to write)")
+
+    paths = {'csv': csv_path}
+    for dtype in ('float32', 'int8'):
+        paths[dtype] = os.path.join(workdir, f"synthetic_{dtype}.traces")
+        start = time.perf_counter()
+        convert_csv(csv_path, paths[dtype], dtype, args.chunk_size)
+        print(f"Converted to {dtype}: {os.path.getsize(paths[dtype]) / 2**20:.0f} MiB "
+              f"in {time.perf_counter() - start:.1f}s")
+
+    baseline = run_measure('baseline', csv_path, args.chunk_size)['peak_rss_mib']
+    print(f"Interpreter and imports alone: {baseline:.0f} MiB peak RSS")
+    print(f"{'format':<10}{'mode':<8}{'load s':>10}{'pass s':>10}{'peak RSS MiB':>15}")
+    for name, path in paths.items():
+        for mode in ('load', 'stream'):
+            result = run_measure(mode, path, args.chunk_size)
+            print(f"{name:<10}{mode:<8}{result['load_s']:>10.3f}{result['full_pass_s']:>10.3f}"
+                  f"{result['peak_rss_mib']:>15.0f}")
+
+
+if __name__ == "__main__":
+    main()
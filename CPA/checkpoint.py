@@ -0,0 +1,77 @@
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from streaming import IncrementalCPA
+from traces import iter_traces
+
+CHECKPOINT_VERSION = 1
+
+
+def trace_digest(plaintext, ciphertext, samples):
+    """ SHA-256 of the content of one or more traces. """
+    digest = hashlib.sha256()
+    for array in (plaintext, ciphertext, samples):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+class Checkpoint:
+    """ Running sums of a streaming attack, saved as <directory>/<key>.npz.
+
+    The key hashes the first trace of the source and the attack parameters, so it stays the same when
+    traces are appended to the capture (or the file is moved) but not when a different capture or
+    format is used. Alongside the sums the digest of the last trace they include is stored; a resumed
+    run checks it against the source before trusting the sums, then only reads the traces after it.
+    Saves go through a temporary file and os.replace, so an interrupted save never leaves a torn file. """
+
+    def __init__(self, directory, source, params, interval=60.0):
+        self.source = source
+        first = next(iter_traces(source, 1))
+        self.params = dict(params, version=CHECKPOINT_VERSION, n_samples=int(first[2].shape[1]))
+        key = hashlib.sha256((trace_digest(*first) + json.dumps(self.params, sort_keys=True)).encode()).hexdigest()
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, key[:24] + '.npz')
+        self.interval = interval
+        self.last_save = time.perf_counter()
+        self.last_trace = None
+        self.saved_traces = 0
+
+    def load(self):
+        """ The saved accumulator, or None when there is no checkpoint or the traces it covers changed. """
+        if not os.path.exists(self.path):
+            return None
+        with np.load(self.path) as saved:
+            state = {name: saved[name] for name in saved.files}
+        n_traces = int(state['n_traces'])
+        last = next(iter_traces(self.source, 1, n_traces - 1), None)
+        if last is None or trace_digest(*last) != str(state['last_trace']):
+            return None
+        self.last_trace = str(state['last_trace'])
+        self.saved_traces = n_traces
+        return IncrementalCPA.from_state(state)
+
+    def save(self, cpa):
+        temporary = self.path + '.tmp'
+        with open(temporary, 'wb') as checkpointFile:
+            np.savez(checkpointFile, last_trace=np.array(self.last_trace), **cpa.state())
+            checkpointFile.flush()
+            os.fsync(checkpointFile.fileno())
+        os.replace(temporary, self.path)
+        self.last_save = time.perf_counter()
+        self.saved_traces = cpa.n_traces
+
+    def __call__(self, cpa, chunk):
+        """ Record the chunk just added to cpa and save if interval seconds passed since the last save. """
+        plaintext, ciphertext, samples = chunk
+        self.last_trace = trace_digest(plaintext[-1:], ciphertext[-1:], samples[-1:])
+        if time.perf_counter() - self.last_save >= self.interval:
+            self.save(cpa)
+
+    def finish(self, cpa):
+        """ Save whatever was added since the last save. """
+        if cpa.n_traces != self.saved_traces:
+            self.save(cpa)
@@ -0,0 +1,53 @@
+from contextlib import nullcontext
+
+import numpy as np
+
+from leakage import HW_SBOX, hypotheses
+
+# Sample columns per matrix product. Every product has the same shape whichever way the samples are
+# split up (see parallel.py), so serial and tiled runs give bit-identical correlations.
+SAMPLE_BLOCK = 512
+
+
+def standardize(matrix, axis):
+    """ Center and scale matrix along axis to unit norm, so dot products give Pearson correlations.
+    Constant rows or columns are zeroed so they correlate as 0 instead of NaN. """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    centered = matrix - matrix.mean(axis=axis, keepdims=True)
+    norm = np.sqrt((centered * centered).sum(axis=axis, keepdims=True))
+    norm[norm == 0] = np.inf
+    return centered / norm
+
+
+def blocked_product(left, right):
+    """ left @ right computed SAMPLE_BLOCK columns of right at a time. """
+    result = np.empty((left.shape[0], right.shape[1]))
+    for start in range(0, right.shape[1], SAMPLE_BLOCK):
+        stop = start + SAMPLE_BLOCK
+        result[:, start:stop] = left @ np.ascontiguousarray(right[:, start:stop])
+    return result
+
+
+def _correlate_standardized(hypothesis, standardized_traces, stage):
+    with stage('correlation'):
+        correlation = blocked_product(hypothesis, standardized_traces)
+    with stage('max'):
+        maxCorrelation = np.abs(correlation).max(axis=1)
+    return correlation, maxCorrelation
+
+
+def attack_hypotheses(hypothesis, standardized_traces, stage=nullcontext):
+    """ Correlation matrix and per-guess absolute maximum for a (256, N) hypothesis matrix. The traces are
+    standardized once by the caller and shared by all bytes and models. Each step runs inside the
+    context manager stage(name), 'hypotheses', 'correlation' then 'max', so a caller can time them. """
+    with stage('hypotheses'):
+        hypothesis = standardize(hypothesis, axis=1)
+    return _correlate_standardized(hypothesis, standardized_traces, stage)
+
+
+def attack_byte(plaintext_bytes, standardized_traces, table=HW_SBOX, stage=nullcontext):
+    """ Correlation matrix and per-guess absolute maximum for one key byte under a leakage model table,
+    with the steps run inside stage(name) as in attack_hypotheses. """
+    with stage('hypotheses'):
+        hypothesis = standardize(hypotheses(table, plaintext_bytes), axis=1)
+    return _correlate_standardized(hypothesis, standardized_traces, stage)
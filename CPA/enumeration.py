@@ -0,0 +1,69 @@
+import heapq
+import time
+
+import numpy as np
+
+from aes import encrypt, expand_key
+
+
+def byte_scores(max_correlations):
+    """ Per-byte log-likelihood of every guess, up to a factor shared by all bytes: with n traces the
+    Fisher transform atanh(r) * sqrt(n - 3) is roughly standard normal, so atanh(r)^2 / 2 * (n - 3) adds
+    up across independent bytes. The (n - 3) / 2 factor does not change the order and is dropped. """
+    return np.arctanh(np.clip(np.abs(max_correlations), 0, 1 - 1e-12)) ** 2
+
+
+def enumerate_keys(scores, batch_size=4096):
+    """ Yield (M, 16) uint8 batches of full keys in decreasing order of summed per-byte score.
+
+    Each key is a vector of per-byte ranks. The bytes are reordered so the cost of leaving the best
+    guess grows with the position, which lets every popped vector push at most three successors (the
+    last non-zero rank +1, the next byte set to rank 1, or that rank-1 moved to the next byte) while
+    still visiting every vector exactly once and in order. """
+    scores = np.asarray(scores, dtype=np.float64)
+    n_bytes = len(scores)
+    guesses = np.argsort(-scores, axis=1, kind='stable')
+    losses = scores.max(axis=1, keepdims=True) - np.take_along_axis(scores, guesses, axis=1)
+    order = np.argsort(losses[:, 1], kind='stable')
+    guesses, losses = guesses[order], losses[order].tolist()
+    positions = np.arange(n_bytes)
+    heap = [(0.0, (0,) * n_bytes, -1)]
+    batch = []
+    while heap:
+        cost, ranks, last = heapq.heappop(heap)
+        batch.append(ranks)
+        if last >= 0 and ranks[last] + 1 < len(losses[last]):
+            heapq.heappush(heap, (cost + losses[last][ranks[last] + 1] - losses[last][ranks[last]],
+                                  ranks[:last] + (ranks[last] + 1,) + ranks[last + 1:], last))
+        if last + 1 < n_bytes:
+            heapq.heappush(heap, (cost + losses[last + 1][1], ranks[:last + 1] + (1,) + ranks[last + 2:], last + 1))
+            if last >= 0 and ranks[last] == 1:
+                heapq.heappush(heap, (cost - losses[last][1] + losses[last + 1][1],
+                                      ranks[:last] + (0, 1) + ranks[last + 2:], last + 1))
+        if len(batch) == batch_size or not heap:
+            keys = np.empty((len(batch), n_bytes), dtype=np.uint8)
+            keys[:, order] = guesses[positions, np.array(batch)]
+            yield keys
+            batch = []
+
+
+def search_key(scores, plaintext, ciphertext, budget=1 << 20, batch_size=4096):
+    """ Enumerate up to `budget` keys best-first and return (key, rank, enumerated, seconds), checking
+    each batch by encrypting plaintext[0] and comparing to ciphertext[0] (a match is confirmed on any
+    further pairs). key and rank are None when the budget runs out; rank counts from 1. """
+    plaintext = np.atleast_2d(plaintext)
+    ciphertext = np.atleast_2d(ciphertext)
+    start = time.perf_counter()
+    enumerated = 0
+    for keys in enumerate_keys(scores, batch_size):
+        keys = keys[:budget - enumerated]
+        matches = np.flatnonzero((encrypt(expand_key(keys), plaintext[0]) == ciphertext[0]).all(axis=1))
+        for match in matches:
+            roundKeys = np.repeat(expand_key(keys[match]), len(plaintext), axis=0)
+            if (encrypt(roundKeys, plaintext) == ciphertext).all():
+                return keys[match], enumerated + int(match) + 1, enumerated + int(match) + 1, \
+                    time.perf_counter() - start
+        enumerated += len(keys)
+        if enumerated >= budget:
+            break
+    return None, None, enumerated, time.perf_counter() - start
@@ -0,0 +1,21 @@
+import numpy as np
+
+from aes import expand_key, invert_key_schedule
+from engine import attack_hypotheses
+from leakage import last_round_hypotheses
+
+
+def last_round_correlations(ciphertext, standardized_traces):
+    """ (16, 256) max correlations of every round 10 key byte guess under the last-round HD model. """
+    return np.stack([attack_hypotheses(last_round_hypotheses(ciphertext, keyIndex), standardized_traces)[1]
+                     for keyIndex in range(ciphertext.shape[1])])
+
+
+def master_key_from_round_key(round_key):
+    """ Master key whose key schedule ends in the recovered round 10 key. """
+    return invert_key_schedule(np.asarray(round_key, dtype=np.uint8))
+
+
+def last_round_key(master_key):
+    """ Round 10 key of a master key, to check last-round results against a known key. """
+    return expand_key(master_key)[0, -1]
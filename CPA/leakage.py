@@ -0,0 +1,61 @@
+import numpy as np
+
+from aes import INV_SBOX, SBOX, SHIFT_ROWS
+
+KEY_GUESSES = 256
+
+
+# Hamming Weight: Number of ones in a byte
+def hw(int_no):
+    count = 0
+    while int_no:
+        count += int_no & 1
+        int_no >>= 1
+    return count
+
+
+HW_TABLE = np.array([hw(value) for value in range(256)], dtype=np.uint8)
+
+# SBOX_INPUT[k, p] = p ^ k and SBOX_OUTPUT[k, p] = Sbox[p ^ k] for key guess k and plaintext byte p
+SBOX_INPUT = np.bitwise_xor.outer(np.arange(KEY_GUESSES), np.arange(256)).astype(np.uint8)
+SBOX_OUTPUT = SBOX[SBOX_INPUT]
+
+# Every leakage model is a (256 guesses, 256 plaintext values) table of the hypothetical power
+HW_SBOX = HW_TABLE[SBOX_OUTPUT]
+MODELS = {
+    'hw_sbox': HW_SBOX,
+    'identity': SBOX_OUTPUT,
+    'hd_sbox': HW_TABLE[SBOX_INPUT ^ SBOX_OUTPUT],
+}
+MODELS.update({'bit{n}'.format(n=bit): (SBOX_OUTPUT >> bit) & 1 for bit in range(8)})
+MODEL_DESCRIPTIONS = {
+    'hw_sbox': "Hamming weight of the S-box output",
+    'identity': "value of the S-box output",
+    'hd_sbox': "Hamming distance between the S-box input and output",
+}
+MODEL_DESCRIPTIONS.update({'bit{n}'.format(n=bit): "bit {n} of the S-box output".format(n=bit) for bit in range(8)})
+
+
+def get_model(name):
+    """ Look up a leakage model table by name. """
+    try:
+        return MODELS[name]
+    except KeyError:
+        raise ValueError("Unknown leakage model {name}, expected one of {names}.".format(
+            name=name, names=", ".join(MODELS))) from None
+
+
+def hypotheses(table, plaintext_bytes):
+    """ Hypothetical power of every key guess for every trace, as a (256, N) array gathered from the table. """
+    return table[:, plaintext_bytes]
+
+
+# INV_SBOX_INPUT[k, c] = InvSbox[c ^ k], the round 10 S-box input for key guess k and ciphertext byte c
+INV_SBOX_INPUT = INV_SBOX[np.bitwise_xor.outer(np.arange(KEY_GUESSES), np.arange(256))]
+
+
+def last_round_hypotheses(ciphertext, byte):
+    """ Hamming distance model for round 10 key byte `byte`: the state register that held the S-box input
+    InvSbox[c[byte] ^ k] is overwritten by the ciphertext byte ShiftRows moves into that position.
+    Returns a (256, N) array for the (N, 16) ciphertext. """
+    return HW_TABLE[INV_SBOX_INPUT[:, ciphertext[:, byte]] ^ ciphertext[:, SHIFT_ROWS[byte]]]
@@ -3,121 +3,368 @@
 
 # https://trinket.io/embed/python3
 
-import matplotlib.pyplot as plt
-import pandas as pd
-import scipy,os
-import scipy.stats
+import argparse
+import cProfile
+import numpy as np
+import os
+import subprocess
 import sys
+from functools import partial
+
+from aes import encrypt, expand_key
+from checkpoint import Checkpoint
+from engine import SAMPLE_BLOCK, attack_byte, standardize
+from enumeration import byte_scores, search_key
+from lastround import last_round_correlations, master_key_from_round_key
+from leakage import KEY_GUESSES, MODEL_DESCRIPTIONS, MODELS
+from parallel import parallel_correlations
+from plot import DEFAULT_DPI
+from poi import POI_METHODS, find_windows, windowed_correlations
+from profiling import profiler
+from results import Progress, save_results
+from secondorder import PAIR_BLOCK, second_order_correlations
+from streaming import run_streaming
+from traces import iter_traces, load_traces
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Correlation Power Analysis on AES-128 power traces.")
+    parser.add_argument("waveform",
+                        help="Waveform CSV (plaintext, ciphertext, then the power samples) or binary trace file.")
+    parser.add_argument("--attack", choices=['first', 'last', 'second'], default='first',
+                        help="first: S-box output of round 1 using the plaintext. last: round 10 using the "
+                             "ciphertext, then invert the key schedule to report the master key. second: "
+                             "second-order attack on pairs of samples within --window, for masked AES.")
+    parser.add_argument("--window", action="append", type=parse_window, metavar="START:STOP",
+                        help="With --attack second, the samples whose pairs are combined. Give it once for every "
+                             "byte or 16 times, one per byte.")
+    parser.add_argument("--pair-block", type=int,
+                        help="With --attack second, sample pairs combined and correlated at a time (default "
+                             "{block}).".format(block=PAIR_BLOCK))
+    parser.add_argument("--model", action="append", choices=list(MODELS),
+                        help="Leakage model (default hw_sbox). Repeat to compare models in one run; the first "
+                             "one is written to key.txt and graphed, the others to key_<model>.txt.")
+    parser.add_argument("--chunk-size", type=int,
+                        help="Stream the traces this many at a time with constant memory.")
+    parser.add_argument("--early-stop", type=int, metavar="K",
+                        help="With --chunk-size, stop once every byte's best guess held for K consecutive chunks.")
+    parser.add_argument("--checkpoint", metavar="DIR",
+                        help="With --chunk-size, keep the running sums in DIR and resume from them: an interrupted "
+                             "run continues where it stopped and traces appended to the capture are added.")
+    parser.add_argument("--checkpoint-interval", type=float, default=60.0,
+                        help="Seconds between checkpoint saves (the sums are always saved at the end).")
+    parser.add_argument("--separation", type=float,
+                        help="With --early-stop, factor by which the best guess must beat the runner-up to count "
+                             "as stable (default 1.1).")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="Attack key bytes in a pool of this many processes (in-memory mode).")
+    parser.add_argument("--tile-samples", type=int,
+                        help="With --jobs, also split each byte into tiles of this many samples, rounded up to "
+                             "a multiple of {block} so the results match the serial run.".format(block=SAMPLE_BLOCK))
+    parser.add_argument("--poi", choices=POI_METHODS,
+                        help="Find the leaking sample windows per byte first (max correlation, SNR or SOSD over "
+                             "plaintext byte values) and only correlate those. Cached in <waveform>.poi.json.")
+    parser.add_argument("--poi-traces", type=int, default=2000, help="Traces used to find the windows.")
+    parser.add_argument("--poi-points", type=int, default=10, help="Best samples kept per byte.")
+    parser.add_argument("--poi-margin", type=int, default=5, help="Samples added either side of each point.")
+    parser.add_argument("--enumerate", type=int, metavar="BUDGET",
+                        help="If the top-ranked key does not encrypt a known plaintext to its ciphertext, try up "
+                             "to BUDGET full keys in order of combined per-byte score (first-round attack).")
+    parser.add_argument("--results", default="results.npz",
+                        help="Where to save the per-guess max correlations of every model (.npz).")
+    parser.add_argument("--full", action="store_true",
+                        help="Also save the full 16x256xS correlation matrix of the first model (serial "
+                             "in-memory or streaming first-round attack).")
+    parser.add_argument("--plot", action="store_true",
+                        help="Render the graphs into KeyGraphs/ in the background once the results are saved.")
+    parser.add_argument("--dpi", type=int, default=DEFAULT_DPI, help="Resolution of the graphs with --plot.")
+    parser.add_argument("--progress-interval", type=float, default=1.0,
+                        help="Seconds between progress lines while streaming or running jobs.")
+    parser.add_argument("--profile", action="store_true",
+                        help="Time every stage (per key byte where it applies), sample the peak memory and count "
+                             "traces x samples x guesses per second; written to --report.")
+    parser.add_argument("--report", default="run_report.json",
+                        help="Where --profile writes its JSON run report.")
+    parser.add_argument("--cprofile", metavar="PATH",
+                        help="Also run under cProfile and dump its stats to PATH (read with pstats or snakeviz).")
+    args = parser.parse_args()
+    if args.poi and (args.chunk_size or args.jobs > 1 or args.attack == 'last'):
+        parser.error("--poi applies to the serial in-memory first-round attack")
+    if args.checkpoint and not args.chunk_size:
+        parser.error("--checkpoint applies to --chunk-size streaming")
+    if args.early_stop and not args.chunk_size:
+        parser.error("--early-stop applies to --chunk-size streaming")
+    if args.separation is not None and not args.early_stop:
+        parser.error("--separation applies to --early-stop")
+    if args.chunk_size and args.jobs > 1:
+        parser.error("--jobs applies to the in-memory engine, not --chunk-size streaming")
+    if args.tile_samples and args.jobs <= 1:
+        parser.error("--tile-samples applies to --jobs")
+    if args.attack == 'last' and (args.chunk_size or args.jobs > 1 or args.model):
+        parser.error("--attack last uses its own Hamming distance model on the in-memory engine")
+    if args.attack == 'second' and (not args.window or len(args.window) not in (1, 16)):
+        parser.error("--attack second needs --window once, or once per key byte")
+    if args.attack == 'second' and (args.chunk_size or args.jobs > 1 or args.poi or args.full):
+        parser.error("--attack second runs on the serial in-memory engine")
+    if args.attack != 'second' and (args.window or args.pair_block):
+        parser.error("--window and --pair-block apply to --attack second")
+    if args.enumerate and args.attack == 'last':
+        parser.error("--enumerate applies to the first-round attack")
+    if args.full and (args.poi or args.jobs > 1 or args.attack == 'last'):
+        parser.error("--full applies to the serial in-memory or streaming first-round attack")
+    args.model = args.model or ['hw_sbox']
+    args.separation = 1.1 if args.separation is None else args.separation
+    args.pair_block = args.pair_block or PAIR_BLOCK
+    return args
+
+
+def parse_window(text):
+    start, stop = (int(value) for value in text.split(':'))
+    if not 0 <= start or stop - start < 2:
+        raise argparse.ArgumentTypeError("Expected START:STOP with 0 <= START and at least 2 samples, got " + text)
+    return start, stop
+
+
+def in_memory_correlations(path, tables, jobs=1, tile_samples=None, poi=None, full=False, progressInterval=1.0):
+    """ Load every trace and return the (models, 16, 256) max correlations, and the first model's
+    (16, 256, S) correlations when full is set (None otherwise). poi is None or a dict of find_windows
+    arguments restricting each byte to its leaking windows. """
+    with profiler.stage('load'):
+        plaintext, ciphertext, powerTraceData = load_traces(path)
+    profiler.set_info(traces=int(powerTraceData.shape[0]), samples=int(powerTraceData.shape[1]))
+    if poi:
+        with profiler.stage('poi'):
+            windows = find_windows(path, plaintext, powerTraceData, **poi)
+        print("Correlating {count} of {total} samples per byte on average".format(
+            count=int(np.mean([sum(stop - start for start, stop in w) for w in windows])),
+            total=powerTraceData.shape[1]))
+        for byteWindows in windows:
+            profiler.add_work(len(tables) * len(powerTraceData), sum(stop - start for start, stop in byteWindows),
+                              KEY_GUESSES)
+        with profiler.stage('cpa'):
+            return windowed_correlations(plaintext, powerTraceData, windows, tables), None
+    if jobs > 1:
+        progress = Progress("Tasks", interval=progressInterval)
+        profiler.add_work(len(tables) * plaintext.shape[1] * powerTraceData.shape[0], powerTraceData.shape[1],
+                          KEY_GUESSES)
+        with profiler.stage('cpa'):
+            return parallel_correlations(plaintext, powerTraceData, jobs, tile_samples, tables, progress.update), None
+    # Comparing the hypothetical power of every possible key byte with every sample of the actual power trace
+    # This is possible as we expect Sbox operation to always be at the same time (since there is a trigger signal)
+    # The traces are standardized once and reused for every model and key byte
+    with profiler.stage('standardize'):
+        standardizedTraces = standardize(powerTraceData, axis=0)
+    # to parse along the whole plaintext to find full key
+    maxCorrelations = np.zeros((len(tables), plaintext.shape[1], KEY_GUESSES))
+    fullCorrelations = np.zeros((plaintext.shape[1], KEY_GUESSES, powerTraceData.shape[1]),
+                                dtype=np.float32) if full else None
+    with profiler.stage('cpa'):
+        for model, table in enumerate(tables):
+            for keyIndex in range(plaintext.shape[1]):
+                with profiler.stage('plaintext', keyIndex):
+                    plaintextBytes = np.ascontiguousarray(plaintext[:, keyIndex])
+                # With --profile the engine's hypotheses, correlation and max steps are timed per byte
+                correlation, maxCorrelations[model, keyIndex] = attack_byte(
+                    plaintextBytes, standardizedTraces, table, partial(profiler.stage, byte=keyIndex))
+                profiler.add_work(*powerTraceData.shape, KEY_GUESSES)
+                if full and model == 0:
+                    fullCorrelations[keyIndex] = correlation
+    return maxCorrelations, fullCorrelations
+
+
+def streaming_correlations(path, chunk_size, patience, separation, tables, full=False, progressInterval=1.0,
+                           checkpointDir=None, checkpointInterval=60.0):
+    """ Accumulate running sums chunk by chunk and return the (models, 16, 256) max correlations, and the
+    first model's full correlations when full is set. The sums do not depend on the model, so extra
+    models cost no extra pass over the traces. With checkpointDir the sums are resumed from and saved
+    to a checkpoint, and only traces after the checkpointed ones are read. """
+    progress = Progress("Traces", interval=progressInterval)
+    cpa, store, start = None, None, 0
+    if checkpointDir:
+        store = Checkpoint(checkpointDir, path, {'attack': 'first'}, checkpointInterval)
+        cpa = store.load()
+        if cpa is not None:
+            start = cpa.n_traces
+            print("Resuming from {checkpoint} after {count} traces".format(checkpoint=store.path, count=start))
+    # Reading the chunks is timed on its own, nested inside the attack
+    chunks = profiler.timed_iter('read', iter_traces(path, chunk_size, start))
+    with profiler.stage('cpa'):
+        cpa, stopping = run_streaming(chunks, patience, separation, tables[0], progress.update, cpa, store)
+    if store is not None:
+        with profiler.stage('checkpoint'):
+            store.finish(cpa)
+    print("Processed {count} traces".format(count=cpa.n_traces))
+    if stopping is not None:
+        for keyIndex, needed in enumerate(stopping.traces_needed()):
+            print("KeyByte {number} needed {traces} traces".format(
+                number=keyIndex, traces=needed if needed is not None else "more than " + str(cpa.n_traces)))
+    profiler.set_info(traces=cpa.n_traces, samples=cpa.n_samples)
+    profiler.add_work(len(tables) * cpa.n_bytes * (cpa.n_traces - start), cpa.n_samples, KEY_GUESSES)
+    with profiler.stage('cpa'):
+        fullCorrelations = np.stack([cpa.correlation(keyIndex, tables[0]) for keyIndex in range(cpa.n_bytes)]) \
+            if full else None
+        return np.stack([cpa.max_correlations(table) for table in tables]), fullCorrelations
+
+
+def last_round_attack(path):
+    """ Recover the round 10 key from the ciphertext. Returns its (16, 256) max correlations and one
+    plaintext/ciphertext pair to check the master key with. """
+    with profiler.stage('load'):
+        plaintext, ciphertext, powerTraceData = load_traces(path)
+    profiler.set_info(traces=int(powerTraceData.shape[0]), samples=int(powerTraceData.shape[1]))
+    with profiler.stage('standardize'):
+        standardizedTraces = standardize(powerTraceData, axis=0)
+    profiler.add_work(ciphertext.shape[1] * powerTraceData.shape[0], powerTraceData.shape[1], KEY_GUESSES)
+    with profiler.stage('cpa'):
+        correlations = last_round_correlations(ciphertext, standardizedTraces)
+    return correlations, (np.array(plaintext[0]), np.array(ciphertext[0]))
+
+
+def second_order_attack(path, tables, windows, pairBlock):
+    """ (models, 16, 256) max correlations of every key guess against the centered products of all
+    sample pairs in each byte's window. """
+    with profiler.stage('load'):
+        plaintext, ciphertext, powerTraceData = load_traces(path)
+    profiler.set_info(traces=int(powerTraceData.shape[0]), samples=int(powerTraceData.shape[1]))
+    for start, stop in windows:
+        if stop > powerTraceData.shape[1]:
+            raise SystemExit("--window {start}:{stop} goes past the {count} samples of each trace".format(
+                start=start, stop=stop, count=powerTraceData.shape[1]))
+    pairs = np.mean([(stop - start) * (stop - start - 1) // 2 for start, stop in windows])
+    print("Combining {pairs:.0f} sample pairs per byte".format(pairs=pairs))
+    # Here the samples are the combined sample pairs
+    profiler.add_work(len(tables) * plaintext.shape[1] * powerTraceData.shape[0], pairs, KEY_GUESSES)
+    with profiler.stage('cpa'):
+        maxCorrelations, bestPairs = second_order_correlations(plaintext, powerTraceData, windows, tables, pairBlock)
+    # Where the mask and the masked value leak, for the best guess of the first model
+    for keyIndex, (byteCorrelations, bytePairs) in enumerate(zip(maxCorrelations[0], bestPairs[0])):
+        first, second = bytePairs[np.argmax(byteCorrelations)]
+        print("KeyByte {number} leaks in samples {first} and {second}".format(number=keyIndex, first=first,
+                                                                                second=second))
+    return maxCorrelations
+
+
+def known_pairs(path, count=2):
+    """ The first few plaintext/ciphertext pairs of the capture, to verify candidate keys with. """
+    plaintext, ciphertext, powerTraceData = next(iter_traces(path, count))
+    return np.array(plaintext), np.array(ciphertext)
+
+
+def enumerate_key(path, maxCorrelations, budget):
+    """ Search the full keys best-first from the per-byte correlations until one encrypts the known
+    plaintexts to their ciphertexts. Returns the key, or None if the budget ran out. """
+    plaintext, ciphertext = known_pairs(path)
+    foundKey, rank, enumerated, seconds = search_key(byte_scores(maxCorrelations), plaintext, ciphertext, budget)
+    print("Enumerated {count} keys in {seconds:.2f}s ({rate:.0f} keys/s)".format(
+        count=enumerated, seconds=seconds, rate=enumerated / max(seconds, 1e-9)))
+    if foundKey is None:
+        print("No key within the first {budget} candidates encrypts the known plaintext".format(budget=budget))
+    else:
+        print("Verified key found at rank {rank}".format(rank=rank))
+    return foundKey
+
+
+def compare_models(models, maxCorrelations):
+    """ Write and print the key recovered by every model after the first, with how clearly it won. """
+    for model, modelCorrelations in zip(models, maxCorrelations):
+        ranked = np.sort(modelCorrelations, axis=1)
+        key = " ".join(hex(k) for k in np.argmax(modelCorrelations, axis=1))
+        print("{model} ({description}): mean max correlation {best:.4f}, mean margin over runner-up {margin:.3f}x"
+              .format(model=model, description=MODEL_DESCRIPTIONS.get(model, model), best=ranked[:, -1].mean(),
+                      margin=(ranked[:, -1] / ranked[:, -2]).mean()))
+        print("  key: " + key)
+        if model != models[0]:
+            with open('key_{model}.txt'.format(model=model), 'w') as modelKeyFile:
+                modelKeyFile.write(key + " ")
 
-# Hamming Weight: Number of ones in a byte
-def hw(int_no):
-    count = 0
-    while int_no:
-        count += int_no & 1
-        int_no >>= 1
-    return count
-
-# Pre-defined everywhere
-Sbox = (
-    0x63, 0x7C, 0x77, 0x7B, 0xF2, 0x6B, 0x6F, 0xC5, 0x30, 0x01, 0x67, 0x2B, 0xFE, 0xD7, 0xAB, 0x76,
-    0xCA, 0x82, 0xC9, 0x7D, 0xFA, 0x59, 0x47, 0xF0, 0xAD, 0xD4, 0xA2, 0xAF, 0x9C, 0xA4, 0x72, 0xC0,
-    0xB7, 0xFD, 0x93, 0x26, 0x36, 0x3F, 0xF7, 0xCC, 0x34, 0xA5, 0xE5, 0xF1, 0x71, 0xD8, 0x31, 0x15,
-    0x04, 0xC7, 0x23, 0xC3, 0x18, 0x96, 0x05, 0x9A, 0x07, 0x12, 0x80, 0xE2, 0xEB, 0x27, 0xB2, 0x75,
-    0x09, 0x83, 0x2C, 0x1A, 0x1B, 0x6E, 0x5A, 0xA0, 0x52, 0x3B, 0xD6, 0xB3, 0x29, 0xE3, 0x2F, 0x84,
-    0x53, 0xD1, 0x00, 0xED, 0x20, 0xFC, 0xB1, 0x5B, 0x6A, 0xCB, 0xBE, 0x39, 0x4A, 0x4C, 0x58, 0xCF,
-    0xD0, 0xEF, 0xAA, 0xFB, 0x43, 0x4D, 0x33, 0x85, 0x45, 0xF9, 0x02, 0x7F, 0x50, 0x3C, 0x9F, 0xA8,
-    0x51, 0xA3, 0x40, 0x8F, 0x92, 0x9D, 0x38, 0xF5, 0xBC, 0xB6, 0xDA, 0x21, 0x10, 0xFF, 0xF3, 0xD2,
-    0xCD, 0x0C, 0x13, 0xEC, 0x5F, 0x97, 0x44, 0x17, 0xC4, 0xA7, 0x7E, 0x3D, 0x64, 0x5D, 0x19, 0x73,
-    0x60, 0x81, 0x4F, 0xDC, 0x22, 0x2A, 0x90, 0x88, 0x46, 0xEE, 0xB8, 0x14, 0xDE, 0x5E, 0x0B, 0xDB,
-    0xE0, 0x32, 0x3A, 0x0A, 0x49, 0x06, 0x24, 0x5C, 0xC2, 0xD3, 0xAC, 0x62, 0x91, 0x95, 0xE4, 0x79,
-    0xE7, 0xC8, 0x37, 0x6D, 0x8D, 0xD5, 0x4E, 0xA9, 0x6C, 0x56, 0xF4, 0xEA, 0x65, 0x7A, 0xAE, 0x08,
-    0xBA, 0x78, 0x25, 0x2E, 0x1C, 0xA6, 0xB4, 0xC6, 0xE8, 0xDD, 0x74, 0x1F, 0x4B, 0xBD, 0x8B, 0x8A,
-    0x70, 0x3E, 0xB5, 0x66, 0x48, 0x03, 0xF6, 0x0E, 0x61, 0x35, 0x57, 0xB9, 0x86, 0xC1, 0x1D, 0x9E,
-    0xE1, 0xF8, 0x98, 0x11, 0x69, 0xD9, 0x8E, 0x94, 0x9B, 0x1E, 0x87, 0xE9, 0xCE, 0x55, 0x28, 0xDF,
-    0x8C, 0xA1, 0x89, 0x0D, 0xBF, 0xE6, 0x42, 0x68, 0x41, 0x99, 0x2D, 0x0F, 0xB0, 0x54, 0xBB, 0x16,
-)
 
 # Read the waveform file to get relevant data
 def main():
+    args = parse_args()
+    if args.profile:
+        profiler.enable()
+        profiler.set_info(attack=args.attack, models=args.model)
+    if args.cprofile:
+        cProfiler = cProfile.Profile()
+        cProfiler.enable()
 
 #===========================File Management and Parsing======================================
 
-    waveformFile = pd.read_csv(sys.argv[1],index_col=None,header=None)
-    no_of_traces = waveformFile.shape[0]
-    plaintextRow = waveformFile.iloc[:,0]
-    powerTraceData = waveformFile.iloc[:,2:]
-    possibleKey = 255
-    if not os.path.exists("KeyGraphs"):
-        os.mkdir("KeyGraphs")
     keyFile = open('key.txt','w')
     keys = ""
 
 #=================================CPA Process================================================
-    # to parse along the whole plaintext to find full key
-    for keyIndex in range(0,len(plaintextRow[0]),2):
-        # To get the nth byte of plaintext 
-        plainTextBytes = []
-        for index in range(0,no_of_traces):
-            byte = plaintextRow[index][keyIndex] + plaintextRow[index][keyIndex+1]
-            plainTextBytes.append(int(byte,16))
-        
-        correlationMatrix = [[]]*possibleKey
-        power_model_matrix = [[]]*possibleKey
-        byteIndex = []
-        for k in range(0,possibleKey):
-            print("At Byte {number}, k = {kIndex}".format(number=int(keyIndex/2),kIndex=k))
-            byteIndex.append(hex(k))
-            leaky_sbox_output_value_array = []
-            hamming_weight_of_leaky_sbox_bytes = []
-            # Filling up the hypothetical power trace for comparison
-            for byte_pos in range(0,no_of_traces):
-                byte_now = plainTextBytes[byte_pos] ^ k
-                Sbox_output_leaky_value = Sbox[byte_now]
-                leaky_sbox_output_value_array.append(Sbox_output_leaky_value)
-                hamming_weight_of_leaky_sbox_bytes.append(hw(leaky_sbox_output_value_array[byte_pos]))
-            power_model_matrix[k] = hamming_weight_of_leaky_sbox_bytes
-
-            correlation_values = []
-            # Comparing power trace of EACH possible byte k with every instance of actual power trace
-            # This is possible as we expect Sbox operation to always be at the same time (since there is a trigger signal)
-            for x in range(1,powerTraceData.shape[1]-1):
-                correlation,pvalue = scipy.stats.pearsonr(power_model_matrix[k],powerTraceData.iloc[:,x])
-                correlation_values.append(correlation)
-            correlationMatrix[k] = correlation_values
-
-        maxCorrelation = []
-        # Finding the absoluten max correlation values for each possible keyByte
-        for keyBytePossible in range(0,len(correlationMatrix)):
-            correlationRow = correlationMatrix[keyBytePossible]
-            highestCorrelation = max(max(correlationRow),abs(min(correlationRow)))
-            maxCorrelation.append(highestCorrelation)
-
-        maxCorr = max(maxCorrelation)
-        key = 0
-        maxIndex = 0
-        maxValue = max(maxCorrelation)
-        maxIndex = maxCorrelation.index(maxValue)
+    tables = [MODELS[model] for model in args.model]
+    fullCorrelations = None
+    if args.attack == 'last':
+        lastRoundCorrelations, knownPair = last_round_attack(args.waveform)
+        modelCorrelations = lastRoundCorrelations[None]
+    elif args.attack == 'second':
+        modelCorrelations = second_order_attack(args.waveform, tables, args.window, args.pair_block)
+    elif args.chunk_size:
+        modelCorrelations, fullCorrelations = streaming_correlations(
+            args.waveform, args.chunk_size, args.early_stop, args.separation, tables, args.full,
+            args.progress_interval, args.checkpoint, args.checkpoint_interval)
+    else:
+        poi = args.poi and {'method': args.poi, 'subset': args.poi_traces, 'points': args.poi_points,
+                            'margin': args.poi_margin, 'model': args.model[0]}
+        modelCorrelations, fullCorrelations = in_memory_correlations(
+            args.waveform, tables, args.jobs, args.tile_samples, poi, args.full, args.progress_interval)
+    if len(args.model) > 1:
+        compare_models(args.model, modelCorrelations)
+    maxCorrelations = modelCorrelations[0]
+
+    for keyIndex, maxCorrelation in enumerate(maxCorrelations):
+        # Finding the absolute max correlation values for each possible keyByte
+        with profiler.stage('argmax', keyIndex):
+            maxIndex = int(np.argmax(maxCorrelation))
         key = hex(maxIndex)
-        print("KeyByte is " + key + " with correlation of " + str(maxCorr))
+        print("KeyByte {number} is ".format(number=keyIndex) + key + " with correlation of " +
+              str(float(maxCorrelation[maxIndex])))
         keys= keys + key + " "
+    if args.attack == 'last':
+        # The bytes above belong to the round 10 key; key.txt holds the master key
+        print("Round 10 key is " + keys)
+        masterKey = master_key_from_round_key(np.argmax(maxCorrelations, axis=1))
+        keys = "".join(hex(k) + " " for k in masterKey)
+        verified = (encrypt(expand_key(masterKey), knownPair[0]) == knownPair[1]).all()
+        print("Master key is " + keys + ("(verified against a known ciphertext)" if verified else
+                                         "(does NOT encrypt a known plaintext to its ciphertext)"))
+    if args.enumerate:
+        with profiler.stage('enumerate'):
+            foundKey = enumerate_key(args.waveform, maxCorrelations, args.enumerate)
+        if foundKey is not None:
+            keys = "".join(hex(k) + " " for k in foundKey)
+            print("Key is " + keys)
+    keyFile.write(keys)
+    keyFile.close()
+    with profiler.stage('save_results'):
+        save_results(args.results, ['hd_last_round'] if args.attack == 'last' else args.model, modelCorrelations,
+                     fullCorrelations, attack=args.attack)
 
 #===========================================Visualisation===================================
 
-        plt.figure(figsize=(10,6))
-        plt.plot(byteIndex,maxCorrelation,label='Correlation Graph for key number' + str(keyIndex))
-        plt.plot(maxIndex, maxCorr, 'ro', markersize=10, label='Max Correlation')  # 'ro' for red circle
-        plt.title("Graph for Key Byte {number}".format(number=keyIndex))
-        plt.annotate(key, xy=(maxIndex, maxValue), xytext=(maxIndex, maxValue),
-                textcoords='offset points', ha='center', va='bottom')
-        plt.xlabel("Key in Hexa")
-        plt.ylabel("Correlation Value")
-        currentDir = os.getcwd()
-        saveLocation = "{currDir}/KeyGraphs/Key{number}.png".format(currDir = currentDir,number=keyIndex)
-        plt.savefig(saveLocation,dpi=300)
-        plt.close()
-    keyFile.write(keys)
+    if args.plot:
+        # Rendering runs in its own process group so the attack can exit without waiting for it
+        # (so with --profile only launching it is timed)
+        plotScript = os.path.join(os.path.dirname(os.path.abspath(__file__)), "plot.py")
+        with profiler.stage('plot'):
+            subprocess.Popen([sys.executable, plotScript, args.results, "--dpi", str(args.dpi)],
+                             stdout=subprocess.DEVNULL, start_new_session=True)
+        print("Rendering graphs into KeyGraphs/ in the background")
+
+#===========================================Profiling=======================================
+
+    if args.cprofile:
+        cProfiler.disable()
+        cProfiler.dump_stats(args.cprofile)
+        print("cProfile stats written to " + args.cprofile)
+    if args.profile:
+        report = profiler.report(args.report, 'cpa', command=sys.argv, key=keys.split())
+        print("Run report written to {path} ({rate:.3g} traces x samples x guesses per second)".format(
+            path=args.report, rate=report['work']['per_s'] or 0))
 
 #======================================Main===============================
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,61 @@
+import numpy as np
+
+from engine import attack_byte, standardize
+from leakage import HW_SBOX
+from streaming import IncrementalCPA
+
+
+def key_ranks(scores, key):
+    """ Rank of the correct guess for every byte given (16, 256) scores: 0 when it scores best, otherwise
+    the number of guesses scoring strictly higher. """
+    key = np.asarray(key, dtype=np.intp)
+    correct = scores[np.arange(len(key)), key]
+    return (scores > correct[:, None]).sum(axis=1)
+
+
+def guessing_entropy(ranks):
+    """ Average rank of the correct byte over experiments and bytes, from (experiments, ..., 16) ranks. """
+    return np.asarray(ranks).mean(axis=0).mean(axis=-1)
+
+
+def success_rate(ranks, order=1):
+    """ Fraction of experiments in which every byte of the key ranks within the first `order` guesses,
+    from (experiments, ..., 16) ranks. """
+    return (np.asarray(ranks) < order).all(axis=-1).mean(axis=0)
+
+
+def incremental_ranks(plaintext, samples, key, steps, order, table=HW_SBOX):
+    """ (len(steps), 16) key ranks after the first n traces of `order`, for each n in steps. Traces are
+    added to one IncrementalCPA between steps instead of recomputing every prefix. """
+    cpa = IncrementalCPA(plaintext.shape[1])
+    ranks = np.empty((len(steps), plaintext.shape[1]), dtype=int)
+    done = 0
+    for step, n in enumerate(steps):
+        chunk = np.sort(order[done:n])
+        cpa.update(plaintext[chunk], samples[chunk])
+        done = n
+        ranks[step] = key_ranks(cpa.max_correlations(table), key)
+    return ranks
+
+
+def batch_ranks(plaintext, samples, key, steps, order, table=HW_SBOX):
+    """ Same as incremental_ranks, recomputing the matrix CPA on every prefix (the reference engine). """
+    ranks = np.empty((len(steps), plaintext.shape[1]), dtype=int)
+    for step, n in enumerate(steps):
+        chunk = np.sort(order[:n])
+        standardized = standardize(samples[chunk], axis=0)
+        scores = np.stack([attack_byte(plaintext[chunk, b], standardized, table)[1] for b in range(plaintext.shape[1])])
+        ranks[step] = key_ranks(scores, key)
+    return ranks
+
+
+RANK_ENGINES = {'incremental': incremental_ranks, 'batch': batch_ranks}
+
+
+def rank_experiments(plaintext, samples, key, steps, experiments, engine='incremental', table=HW_SBOX, seed=0):
+    """ (experiments, len(steps), 16) key ranks, each experiment drawing its traces in a new random order
+    so the first n traces are a random subset of size n. """
+    rng = np.random.default_rng(seed)
+    rank = RANK_ENGINES[engine]
+    return np.stack([rank(plaintext, samples, key, steps, rng.permutation(len(samples)), table)
+                     for experiment in range(experiments)])
@@ -0,0 +1,72 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from engine import SAMPLE_BLOCK, attack_byte, standardize
+from leakage import HW_SBOX, KEY_GUESSES
+
+# Views onto the shared arrays, set once per worker process by _attach
+_shared = {}
+
+
+def _share(array):
+    """ Copy array into a new shared memory block and return the block and a view onto it. """
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+    view[...] = array
+    return block, view
+
+
+def _attach(plaintext_spec, traces_spec, tables):
+    """ Worker initializer: map the parent's shared plaintext and standardized traces without copying. """
+    _shared['tables'] = tables
+    for key, (name, shape, dtype) in (('plaintext', plaintext_spec), ('traces', traces_spec)):
+        block = shared_memory.SharedMemory(name=name)
+        _shared[key + '_block'] = block
+        _shared[key] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+def _attack_tile(task):
+    """ Per-guess max correlation of one leakage model and key byte over samples start..stop. """
+    model, keyIndex, start, stop = task
+    plaintext, traces = _shared['plaintext'], _shared['traces']
+    return task, attack_byte(plaintext[:, keyIndex], traces[:, start:stop], _shared['tables'][model])[1]
+
+
+def plan_tasks(n_models, n_bytes, n_samples, tile_samples=None):
+    """ One task per model and key byte, or per model, key byte and sample tile when tile_samples is set.
+    Tiles are rounded up to whole engine blocks so every matrix product matches the serial run. """
+    tile = -(-(tile_samples or n_samples) // SAMPLE_BLOCK) * SAMPLE_BLOCK
+    return [(model, keyIndex, start, min(start + tile, n_samples)) for model in range(n_models)
+            for keyIndex in range(n_bytes) for start in range(0, n_samples, tile)]
+
+
+def parallel_correlations(plaintext, samples, jobs, tile_samples=None, tables=(HW_SBOX,), progress=None):
+    """ (models, 16, 256) max correlations with the model/byte/tile tasks spread over a pool of jobs processes.
+    progress, if given, is called with the number of finished tasks as results come back.
+
+    The traces are standardized once in this process, exactly as the serial engine does, and shared with
+    the workers through shared memory; only the small per-task results travel back. Each sample's
+    correlation only depends on its own column, so the combined maxima equal the serial result. """
+    standardized = standardize(samples, axis=0)
+    plaintext = np.ascontiguousarray(plaintext)
+    plaintext_block, plaintext_view = _share(plaintext)
+    traces_block, traces_view = _share(standardized)
+    del standardized
+    try:
+        initargs = ((plaintext_block.name, plaintext_view.shape, plaintext_view.dtype),
+                    (traces_block.name, traces_view.shape, traces_view.dtype), list(tables))
+        maxCorrelations = np.zeros((len(tables), plaintext.shape[1], KEY_GUESSES))
+        tasks = plan_tasks(len(tables), plaintext.shape[1], traces_view.shape[1], tile_samples)
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_attach, initargs=initargs) as pool:
+            for done, ((model, keyIndex, start, stop), tileMax) in enumerate(pool.map(_attack_tile, tasks), 1):
+                maxCorrelations[model, keyIndex] = np.maximum(maxCorrelations[model, keyIndex], tileMax)
+                if progress:
+                    progress(done)
+        return maxCorrelations
+    finally:
+        del plaintext_view, traces_view
+        for block in (plaintext_block, traces_block):
+            block.close()
+            block.unlink()
@@ -0,0 +1,75 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from results import load_results
+
+# Also the default of main.py --dpi, so both render the same results alike
+DEFAULT_DPI = 300
+
+
+def plot_key_byte(task):
+    """ Render one key byte's graph(s); runs in a worker process with the non-interactive backend. """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    keyIndex, maxCorrelation, correlation, directory, dpi = task
+    maxIndex = int(np.argmax(maxCorrelation))
+    maxValue = float(maxCorrelation[maxIndex])
+    key = hex(maxIndex)
+    # Graphs are numbered by hex character offset into the plaintext, as before
+    graphNumber = 2 * keyIndex
+    plt.figure(figsize=(10, 6))
+    plt.plot([hex(k) for k in range(len(maxCorrelation))], maxCorrelation,
+             label='Correlation Graph for key number' + str(keyIndex))
+    plt.plot(maxIndex, maxValue, 'ro', markersize=10, label='Max Correlation')
+    plt.title("Graph for Key Byte {number}".format(number=graphNumber))
+    plt.annotate(key, xy=(maxIndex, maxValue), xytext=(maxIndex, maxValue),
+                 textcoords='offset points', ha='center', va='bottom')
+    plt.xlabel("Key in Hexa")
+    plt.ylabel("Correlation Value")
+    plt.savefig(os.path.join(directory, "Key{number}.png".format(number=graphNumber)), dpi=dpi)
+    plt.close()
+    if correlation is not None:
+        # Correlation over time: the best guess against all the others
+        plt.figure(figsize=(10, 6))
+        plt.plot(np.abs(correlation).max(axis=0), color='lightgrey', label='Best of all guesses')
+        plt.plot(np.abs(correlation[maxIndex]), label='Guess ' + key)
+        plt.title("Correlation over time for Key Byte {number}".format(number=graphNumber))
+        plt.xlabel("Sample")
+        plt.ylabel("Absolute Correlation")
+        plt.legend()
+        plt.savefig(os.path.join(directory, "Key{number}_samples.png".format(number=graphNumber)), dpi=dpi)
+        plt.close()
+    return keyIndex
+
+
+def plot_results(path, directory="KeyGraphs", dpi=DEFAULT_DPI, jobs=None, model=0):
+    """ Render every key byte of an .npz result file in a pool of processes. """
+    results = load_results(path)
+    maxCorrelations = results['max_correlations'][model]
+    correlations = results.get('correlations') if model == 0 else None
+    os.makedirs(directory, exist_ok=True)
+    tasks = [(keyIndex, maxCorrelations[keyIndex], None if correlations is None else correlations[keyIndex],
+              directory, dpi) for keyIndex in range(len(maxCorrelations))]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(plot_key_byte, tasks))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the correlation graphs of a CPA result file.")
+    parser.add_argument("results", nargs='?', default="results.npz", help="Result file written by main.py.")
+    parser.add_argument("--output", default="KeyGraphs", help="Directory for the graphs.")
+    parser.add_argument("--dpi", type=int, default=DEFAULT_DPI, help="Resolution of the saved graphs.")
+    parser.add_argument("--jobs", type=int, help="Rendering processes (default one per CPU).")
+    parser.add_argument("--model", type=int, default=0, help="Index of the leakage model to plot.")
+    args = parser.parse_args()
+    rendered = plot_results(args.results, args.output, args.dpi, args.jobs, args.model)
+    print("Rendered {count} key bytes into {directory}".format(count=len(rendered), directory=args.output))
+
+
+if __name__ == "__main__":
+    main()
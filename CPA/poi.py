@@ -0,0 +1,122 @@
+import json
+import os
+
+import numpy as np
+
+from engine import attack_byte, standardize
+from leakage import HW_SBOX, get_model
+
+POI_METHODS = ('corr', 'snr', 'sosd')
+
+
+def class_statistics(values, samples):
+    """ Count, mean and variance of the samples of each plaintext byte value, as (256,) and (256, S) arrays. """
+    counts = np.bincount(values, minlength=256).astype(np.float64)
+    sums = np.zeros((256, samples.shape[1]))
+    squares = np.zeros((256, samples.shape[1]))
+    order = np.argsort(values, kind='stable')
+    sorted_values = values[order]
+    starts = np.flatnonzero(np.r_[True, sorted_values[1:] != sorted_values[:-1]])
+    grouped = samples[order]
+    sums[sorted_values[starts]] = np.add.reduceat(grouped, starts, axis=0)
+    squares[sorted_values[starts]] = np.add.reduceat(grouped * grouped, starts, axis=0)
+    present = counts > 0
+    means = np.zeros_like(sums)
+    means[present] = sums[present] / counts[present, None]
+    variances = np.zeros_like(sums)
+    variances[present] = squares[present] / counts[present, None] - means[present] ** 2
+    return counts, means, variances
+
+
+def score_samples(method, plaintext, samples, table=HW_SBOX):
+    """ (16, S) leakage score of every sample for every key byte.
+
+    snr and sosd group the traces by plaintext byte value, which any first-round leakage depends on
+    without knowing the key; they need several traces per value. corr is the largest absolute correlation
+    over all key guesses, which also works on small trace sets. """
+    samples = np.asarray(samples, dtype=np.float64)
+    scores = np.empty((plaintext.shape[1], samples.shape[1]))
+    if method == 'corr':
+        standardized = standardize(samples, axis=0)
+    for byte in range(plaintext.shape[1]):
+        if method == 'corr':
+            scores[byte] = np.abs(attack_byte(plaintext[:, byte], standardized, table)[0]).max(axis=0)
+            continue
+        counts, means, variances = class_statistics(plaintext[:, byte], samples)
+        present = counts > 0
+        means = means[present]
+        if method == 'snr':
+            noise = np.average(variances[present], axis=0, weights=counts[present])
+            noise[noise == 0] = np.inf
+            scores[byte] = means.var(axis=0) / noise
+        else:
+            # Sum of squared pairwise differences of the class means, without forming every pair
+            k = len(means)
+            scores[byte] = k * (means * means).sum(axis=0) - means.sum(axis=0) ** 2
+    return scores
+
+
+def select_windows(scores, points=10, margin=5):
+    """ Per byte, widen the `points` best-scoring samples by `margin` on each side and merge overlaps.
+    Returns a list of [start, stop) window lists, one per byte. """
+    n_samples = scores.shape[1]
+    windows = []
+    for byteScores in scores:
+        best = np.sort(np.argsort(byteScores)[::-1][:points])
+        merged = []
+        for sample in best.tolist():
+            start, stop = max(sample - margin, 0), min(sample + margin + 1, n_samples)
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], stop)
+            else:
+                merged.append([start, stop])
+        windows.append(merged)
+    return windows
+
+
+def window_columns(windows):
+    """ Sample indices covered by a byte's windows. """
+    return np.concatenate([np.arange(start, stop) for start, stop in windows])
+
+
+def _cache_path(path):
+    return path + '.poi.json'
+
+
+def _cache_key(path, method, subset, points, margin, model):
+    status = os.stat(path)
+    return {'size': status.st_size, 'mtime': status.st_mtime, 'method': method, 'traces': subset,
+            'points': points, 'margin': margin, 'model': model}
+
+
+def find_windows(path, plaintext, samples, method='corr', subset=2000, points=10, margin=5, model='hw_sbox'):
+    """ Leaking sample windows per byte, scored on the first `subset` traces (under the leakage model
+    named `model` for 'corr'). Results are cached in <path>.poi.json and reused while the trace file
+    and parameters stay the same. """
+    subset = min(subset, len(samples))
+    key = _cache_key(path, method, subset, points, margin, model)
+    cache = _cache_path(path)
+    if os.path.exists(cache):
+        with open(cache) as cacheFile:
+            cached = json.load(cacheFile)
+        if cached.get('key') == key:
+            return cached['windows']
+    scores = score_samples(method, plaintext[:subset], samples[:subset], get_model(model))
+    windows = select_windows(scores, points, margin)
+    with open(cache, 'w') as cacheFile:
+        json.dump({'key': key, 'windows': windows}, cacheFile)
+    return windows
+
+
+def windowed_correlations(plaintext, samples, windows, tables=(HW_SBOX,)):
+    """ (models, 16, 256) max correlations using only each byte's window samples. Only the union of the
+    windows is read and standardized, and each column's correlation is unaffected by the others. """
+    columns = np.unique(np.concatenate([window_columns(byteWindows) for byteWindows in windows]))
+    standardized = standardize(samples[:, columns], axis=0)
+    result = np.zeros((len(tables), len(windows), 256))
+    for byte, byteWindows in enumerate(windows):
+        byteColumns = np.searchsorted(columns, window_columns(byteWindows))
+        byteTraces = standardized[:, byteColumns]
+        for model, table in enumerate(tables):
+            result[model, byte] = attack_byte(plaintext[:, byte], byteTraces, table)[1]
+    return result
@@ -0,0 +1,168 @@
+import argparse
+import time
+
+import numpy as np
+
+from traces import create_trace_file, iter_traces, trace_count
+
+
+class Align:
+    """ Static alignment: shift every trace by the lag (up to max_shift samples either way) that best
+    cross-correlates it with a reference trace, optionally over the reference samples start..stop only.
+    The reference is the first trace seen unless one is given. """
+
+    def __init__(self, max_shift, start=None, stop=None, reference=None):
+        self.max_shift = max_shift
+        self.start = start
+        self.stop = stop
+        self.reference = reference
+        self.name = "align({shift})".format(shift=max_shift)
+
+    def _prepare(self, n_samples):
+        segment = np.zeros(n_samples)
+        start = self.start or 0
+        stop = self.stop or n_samples
+        segment[start:stop] = self.reference[start:stop] - self.reference[start:stop].mean()
+        self.n_fft = 1 << int(np.ceil(np.log2(n_samples + self.max_shift)))
+        self.reference_spectrum = np.conj(np.fft.rfft(segment, self.n_fft))
+        self.lags = np.r_[np.arange(0, self.max_shift + 1), np.arange(-self.max_shift, 0)]
+
+    def __call__(self, samples):
+        if self.reference is None:
+            self.reference = np.array(samples[0], dtype=np.float64)
+        if not hasattr(self, 'reference_spectrum'):
+            self._prepare(samples.shape[1])
+        centered = samples - samples.mean(axis=1, keepdims=True)
+        # Circular cross-correlation, zero padded so lags up to max_shift do not wrap
+        correlation = np.fft.irfft(np.fft.rfft(centered, self.n_fft) * self.reference_spectrum, self.n_fft)
+        correlation = correlation[:, self.lags]
+        shift = self.lags[np.argmax(correlation, axis=1)]
+        index = np.clip(np.arange(samples.shape[1])[None, :] + shift[:, None], 0, samples.shape[1] - 1)
+        return np.take_along_axis(samples, index, axis=1)
+
+
+class MovingAverage:
+    """ Moving average over width samples, keeping the trace length (edges average what is available). """
+
+    def __init__(self, width):
+        self.width = width
+        self.name = "movavg({width})".format(width=width)
+
+    def __call__(self, samples):
+        n_samples = samples.shape[1]
+        cumulative = np.concatenate([np.zeros((len(samples), 1)), np.cumsum(samples, axis=1)], axis=1)
+        low = np.clip(np.arange(n_samples) - self.width // 2, 0, n_samples)
+        high = np.clip(low + self.width, 0, n_samples)
+        return (cumulative[:, high] - cumulative[:, low]) / (high - low)
+
+
+class LowPass:
+    """ Removes frequencies above cutoff, given as a fraction of the Nyquist frequency. """
+
+    def __init__(self, cutoff):
+        self.cutoff = cutoff
+        self.name = "lowpass({cutoff})".format(cutoff=cutoff)
+
+    def __call__(self, samples):
+        spectrum = np.fft.rfft(samples, axis=1)
+        spectrum[:, int(np.ceil(self.cutoff * (spectrum.shape[1] - 1))) + 1:] = 0
+        return np.fft.irfft(spectrum, samples.shape[1], axis=1)
+
+
+class Decimate:
+    """ Keeps every factor-th sample. """
+
+    def __init__(self, factor):
+        self.factor = factor
+        self.name = "decimate({factor})".format(factor=factor)
+
+    def __call__(self, samples):
+        return samples[:, ::self.factor]
+
+
+class WindowSum:
+    """ Sums consecutive non-overlapping windows of width samples, dropping a partial last window. """
+
+    def __init__(self, width):
+        self.width = width
+        self.name = "winsum({width})".format(width=width)
+
+    def __call__(self, samples):
+        n_windows = samples.shape[1] // self.width
+        return samples[:, :n_windows * self.width].reshape(len(samples), n_windows, self.width).sum(axis=2)
+
+
+STAGES = {'align': Align, 'movavg': MovingAverage, 'lowpass': LowPass, 'decimate': Decimate, 'winsum': WindowSum}
+
+
+def parse_stage(spec):
+    """ Build a stage from 'name:arg[:arg...]', e.g. 'align:50', 'align:50:1000:1400', 'lowpass:0.2'. """
+    name, *values = spec.split(':')
+    if name not in STAGES:
+        raise argparse.ArgumentTypeError("Unknown stage {name}, expected one of {names}.".format(
+            name=name, names=", ".join(STAGES)))
+    if name == 'lowpass':
+        return LowPass(float(values[0]))
+    return STAGES[name](*(int(value) for value in values))
+
+
+class Pipeline:
+    """ Applies stages in order to chunks of traces and records the time spent in each. """
+
+    def __init__(self, stages):
+        self.stages = stages
+        self.timings = {stage.name: 0.0 for stage in stages}
+
+    def __call__(self, samples):
+        samples = np.asarray(samples, dtype=np.float64)
+        for stage in self.stages:
+            start = time.perf_counter()
+            samples = stage(samples)
+            self.timings[stage.name] += time.perf_counter() - start
+        return samples
+
+    def run(self, source, output, chunk_size=5000):
+        """ Stream source (CSV or trace file) through the stages into a new binary trace file. """
+        n_traces = trace_count(source, chunk_size)
+        chunks = iter_traces(source, chunk_size)
+        plaintext, ciphertext, samples = next(chunks)
+        processed = self(samples)
+        out_plaintext, out_ciphertext, out_samples = create_trace_file(output, n_traces, processed.shape[1])
+        begin = 0
+        while True:
+            end = begin + len(processed)
+            out_plaintext[begin:end] = plaintext
+            out_ciphertext[begin:end] = ciphertext
+            out_samples[begin:end] = processed
+            begin = end
+            try:
+                plaintext, ciphertext, samples = next(chunks)
+            except StopIteration:
+                break
+            processed = self(samples)
+        for section in (out_plaintext, out_ciphertext, out_samples):
+            section.flush()
+        return n_traces, out_samples.shape[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Preprocess power traces chunk by chunk into a binary trace file.")
+    parser.add_argument("source", help="Waveform CSV or binary trace file.")
+    parser.add_argument("output", help="Binary trace file to write.")
+    parser.add_argument("--stage", action="append", type=parse_stage, required=True,
+                        help="Stage to apply, in order: align:MAX_SHIFT[:START:STOP], movavg:WIDTH, "
+                             "lowpass:CUTOFF, decimate:FACTOR, winsum:WIDTH.")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Traces processed at a time.")
+    args = parser.parse_args()
+
+    pipeline = Pipeline(args.stage)
+    start = time.perf_counter()
+    n_traces, n_samples = pipeline.run(args.source, args.output, args.chunk_size)
+    print("Wrote {traces} traces x {samples} samples to {path} in {seconds:.2f}s".format(
+        traces=n_traces, samples=n_samples, path=args.output, seconds=time.perf_counter() - start))
+    for name, seconds in pipeline.timings.items():
+        print("  {name:<20}{seconds:8.3f}s".format(name=name, seconds=seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import json
+import os
+import platform
+import resource
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+
+def _status_mib(field):
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_mib():
+    """ Peak resident set size of this process. VmHWM is preferred because ru_maxrss is inherited from the
+    parent across fork/exec on Linux. """
+    peak = _status_mib('VmHWM')
+    return peak if peak is not None else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def current_rss_mib():
+    current = _status_mib('VmRSS')
+    return current if current is not None else peak_rss_mib()
+
+
+class Profiler:
+    """ Optional instrumentation for a CPA run.
+
+    stage(name, byte) times a block and adds it to the stage's total (and to the byte's entry when
+    given); stages may nest, e.g. 'stream/read' inside 'stream'. While enabled a background thread
+    samples the resident set size every sample_interval seconds and keeps the largest value seen
+    during each stage. add_work counts traces x samples x guesses so runs of different engines and
+    sizes can be compared by throughput. When disabled every call is a no-op. """
+
+    def __init__(self):
+        self.enabled = False
+
+    def enable(self, sample_interval=0.05):
+        self.enabled = True
+        self.start = time.perf_counter()
+        self.seconds = {}
+        self.calls = {}
+        self.per_byte = {}
+        self.memory = {}
+        self.work = 0
+        self.info = {}
+        self.active = []
+        self.sample_interval = sample_interval
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+
+    def _sample(self):
+        while not self._stop.wait(self.sample_interval):
+            rss = current_rss_mib()
+            for name in list(self.active):
+                self.memory[name] = max(self.memory.get(name, 0.0), rss)
+
+    @contextmanager
+    def stage(self, name, byte=None):
+        if not self.enabled:
+            yield
+            return
+        self.active.append(name)
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - began
+            self.active.remove(name)
+            self.seconds[name] = self.seconds.get(name, 0.0) + elapsed
+            self.calls[name] = self.calls.get(name, 0) + 1
+            self.memory[name] = max(self.memory.get(name, 0.0), current_rss_mib())
+            if byte is not None:
+                perByte = self.per_byte.setdefault(name, {})
+                perByte[byte] = perByte.get(byte, 0.0) + elapsed
+
+    def timed_iter(self, name, iterable):
+        """ Yield from iterable, timing each step as stage name (e.g. reading chunks from disk). """
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                item = next(iterator, StopIteration)
+            if item is StopIteration:
+                return
+            yield item
+
+    def add_work(self, traces, samples, guesses):
+        if self.enabled:
+            self.work += int(traces) * int(samples) * int(guesses)
+
+    def set_info(self, **info):
+        if self.enabled:
+            self.info.update(info)
+
+    def report(self, path, work_stage, **extra):
+        """ Write the JSON run report; throughput is the counted work over the work_stage time. """
+        if not self.enabled:
+            return None
+        self._stop.set()
+        wall = time.perf_counter() - self.start
+        workSeconds = self.seconds.get(work_stage)
+        report = {
+            'wall_s': wall,
+            'stages': {name: {'seconds': seconds, 'calls': self.calls[name],
+                              'peak_rss_mib': self.memory.get(name)} for name, seconds in self.seconds.items()},
+            'per_byte_s': {name: [byteSeconds.get(byte, 0.0) for byte in range(max(byteSeconds) + 1)]
+                           for name, byteSeconds in self.per_byte.items()},
+            'peak_rss_mib': peak_rss_mib(),
+            'work': {'traces_x_samples_x_guesses': self.work, 'stage': work_stage,
+                     'per_s': self.work / workSeconds if workSeconds else None},
+            'python': platform.python_version(), 'numpy': np.__version__, 'cpus': os.cpu_count(),
+        }
+        report.update(self.info)
+        report.update(extra)
+        with open(path, 'w') as reportFile:
+            json.dump(report, reportFile, indent=2)
+        return report
+
+
+# Used by main.py; every call is a no-op unless it is run with --profile
+profiler = Profiler()
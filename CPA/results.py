@@ -0,0 +1,44 @@
+import sys
+import time
+
+import numpy as np
+
+
+def save_results(path, models, max_correlations, correlations=None, **metadata):
+    """ Write the (models, 16, 256) per-guess max correlations to an .npz file, optionally with the first
+    model's full (16, 256, S) correlation matrix stored as float32. Extra keyword arguments are stored
+    as small arrays (e.g. attack='first'). """
+    arrays = {'models': np.array(models), 'max_correlations': np.asarray(max_correlations, dtype=np.float32)}
+    if correlations is not None:
+        arrays['correlations'] = np.asarray(correlations, dtype=np.float32)
+    arrays.update((name, np.asarray(value)) for name, value in metadata.items())
+    np.savez(path, **arrays)
+
+
+def load_results(path):
+    """ Read an .npz written by save_results into a dict of arrays. """
+    with np.load(path) as results:
+        return {name: results[name] for name in results.files}
+
+
+class Progress:
+    """ Rate-limited progress line on stderr: update() only writes when interval seconds have passed
+    since the last write, so reporting never costs more than a few writes per second. """
+
+    def __init__(self, label, total=None, interval=1.0, stream=sys.stderr):
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.stream = stream
+        self.start = self.last = time.perf_counter()
+
+    def update(self, done, force=False):
+        now = time.perf_counter()
+        if not force and now - self.last < self.interval:
+            return
+        self.last = now
+        rate = done / max(now - self.start, 1e-9)
+        total = "/{total}".format(total=self.total) if self.total else ""
+        self.stream.write("{label}: {done}{total} ({rate:.0f}/s)\n".format(
+            label=self.label, done=done, total=total, rate=rate))
+        self.stream.flush()
@@ -0,0 +1,79 @@
+import numpy as np
+
+from leakage import HW_SBOX, KEY_GUESSES
+
+PAIR_BLOCK = 2048
+TRACE_CHUNK = 4096
+
+
+def window_pairs(width):
+    """ Indices (i, j), i < j, of every pair of samples in a window of `width` samples. """
+    return np.triu_indices(width, 1)
+
+
+def second_order_byte(plaintext_bytes, samples, window, tables=(HW_SBOX,), pair_block=PAIR_BLOCK,
+                      trace_chunk=TRACE_CHUNK):
+    """ Second-order CPA of one key byte over samples window = (start, stop).
+
+    Every pair of window samples is combined into the centered product (t_i - mean_i)(t_j - mean_j),
+    which against a first-order Boolean masked implementation correlates with the unmasked leakage.
+    The W(W-1)/2 combined columns are never formed at once: pairs are processed pair_block at a time,
+    and for each block the traces trace_chunk at a time. As in IncrementalCPA the combined samples are
+    summed per plaintext byte value (the traces are sorted by it once, so each class is contiguous),
+    and table @ class sums gives sum(h * c) for all 256 guesses. The class sums do not depend on the
+    model, so they are formed once per block and shared by every table. Returns the (models, 256)
+    absolute max correlation per guess and the (models, 256, 2) sample pair where it was reached. """
+    start, stop = window
+    if not 0 <= start or stop - start < 2 or stop > samples.shape[1]:
+        raise ValueError(f"Window {start}:{stop} must hold at least 2 of the {samples.shape[1]} samples.")
+    order = np.argsort(plaintext_bytes, kind='stable')
+    values = np.asarray(plaintext_bytes)[order]
+    columns = np.asarray(samples[:, start:stop], dtype=np.float64)[order]
+    centered = columns - columns.mean(axis=0)
+    n_traces = len(centered)
+    chunks = []
+    for chunk in range(0, n_traces, trace_chunk):
+        chunkValues = values[chunk:chunk + trace_chunk]
+        starts = np.flatnonzero(np.r_[True, chunkValues[1:] != chunkValues[:-1]])
+        chunks.append((chunk, chunkValues[starts], starts))
+    tables = [np.asarray(table, dtype=np.float64) for table in tables]
+    counts = np.bincount(values, minlength=256).astype(np.float64)
+    sums_h = [table @ counts for table in tables]
+    vars_h = [(table * table) @ counts - sum_h * sum_h / n_traces for table, sum_h in zip(tables, sums_h)]
+    first, second = window_pairs(stop - start)
+    best = np.zeros((len(tables), KEY_GUESSES))
+    bestPair = np.zeros((len(tables), KEY_GUESSES, 2), dtype=int)
+    for begin in range(0, len(first), pair_block):
+        i, j = first[begin:begin + pair_block], second[begin:begin + pair_block]
+        sum_cc = np.zeros(len(i))
+        class_sums = np.zeros((256, len(i)))
+        for chunk, classes, starts in chunks:
+            rows = centered[chunk:chunk + trace_chunk]
+            combined = rows[:, i] * rows[:, j]
+            sum_cc += (combined * combined).sum(axis=0)
+            class_sums[classes] += np.add.reduceat(combined, starts, axis=0)
+        sum_c = class_sums.sum(axis=0)
+        var_c = np.clip(sum_cc - sum_c * sum_c / n_traces, 0, None)
+        for model, (table, sum_h, var_h) in enumerate(zip(tables, sums_h, vars_h)):
+            covariance = table @ class_sums - np.outer(sum_h, sum_c) / n_traces
+            denominator = np.sqrt(np.outer(np.clip(var_h, 0, None), var_c))
+            denominator[denominator == 0] = np.inf
+            correlation = np.abs(covariance / denominator)
+            blockBest = np.argmax(correlation, axis=1)
+            blockMax = correlation[np.arange(KEY_GUESSES), blockBest]
+            improved = blockMax > best[model]
+            best[model, improved] = blockMax[improved]
+            bestPair[model, improved] = np.stack([i[blockBest], j[blockBest]], axis=1)[improved] + start
+    return best, bestPair
+
+
+def second_order_correlations(plaintext, samples, windows, tables=(HW_SBOX,), pair_block=PAIR_BLOCK,
+                              trace_chunk=TRACE_CHUNK):
+    """ (models, 16, 256) second-order max correlations and the (models, 16, 256, 2) sample pairs where
+    they were reached. windows is one (start, stop) shared by every byte or one per byte. """
+    windows = list(windows)
+    if len(windows) == 1:
+        windows = windows * plaintext.shape[1]
+    best, bestPairs = zip(*[second_order_byte(plaintext[:, keyIndex], samples, windows[keyIndex], tables, pair_block,
+                                              trace_chunk) for keyIndex in range(plaintext.shape[1])])
+    return np.stack(best, axis=1), np.stack(bestPairs, axis=1)
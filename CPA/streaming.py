@@ -0,0 +1,143 @@
+import numpy as np
+
+from leakage import HW_SBOX
+from traces import BLOCK_BYTES
+
+
+class IncrementalCPA:
+    """ Online CPA keeping running sums instead of the traces themselves.
+
+    For every key byte the samples are summed per plaintext byte value, which together with the trace
+    sums is enough to rebuild sum(h), sum(h^2) and sum(h*t) for any hypothesis that depends on that
+    plaintext byte. Memory is fixed at (16, 256, S) regardless of the number of traces. """
+
+    def __init__(self, n_bytes=BLOCK_BYTES):
+        self.n_bytes = n_bytes
+        self.n_traces = 0
+        self.n_samples = None
+        self.offset = None
+        self.sum_t = None
+        self.sum_tt = None
+        self.class_counts = None
+        self.class_sums = None
+
+    def _allocate(self, n_samples):
+        self.n_samples = n_samples
+        self.sum_t = np.zeros(n_samples)
+        self.sum_tt = np.zeros(n_samples)
+        self.class_counts = np.zeros((self.n_bytes, 256))
+        self.class_sums = np.zeros((self.n_bytes, 256, n_samples))
+
+    def update(self, plaintext, samples):
+        """ Add a chunk of traces: plaintext is (n, 16) uint8 and samples is (n, S). """
+        samples = np.asarray(samples, dtype=np.float64)
+        if self.sum_t is None:
+            self._allocate(samples.shape[1])
+            # Sums are kept relative to the first chunk's mean to avoid cancellation over millions of traces
+            self.offset = samples.mean(axis=0)
+        elif samples.shape[1] != self.n_samples:
+            raise ValueError(f"Expected {self.n_samples} samples per trace, got {samples.shape[1]}.")
+        centered = samples - self.offset
+        self.n_traces += len(samples)
+        self.sum_t += centered.sum(axis=0)
+        self.sum_tt += (centered * centered).sum(axis=0)
+        for byte in range(self.n_bytes):
+            values = plaintext[:, byte]
+            order = np.argsort(values, kind='stable')
+            sorted_values = values[order]
+            starts = np.flatnonzero(np.r_[True, sorted_values[1:] != sorted_values[:-1]])
+            self.class_counts[byte] += np.bincount(values, minlength=256)
+            self.class_sums[byte, sorted_values[starts]] += np.add.reduceat(centered[order], starts, axis=0)
+
+    STATE = ('n_traces', 'offset', 'sum_t', 'sum_tt', 'class_counts', 'class_sums')
+
+    def state(self):
+        """ The running sums as a dict of arrays, e.g. to save with np.savez. """
+        return {name: np.asarray(getattr(self, name)) for name in self.STATE}
+
+    @classmethod
+    def from_state(cls, state):
+        """ Rebuild an accumulator from state(); further updates continue the same sums. """
+        cpa = cls(len(state['class_counts']))
+        for name in cls.STATE:
+            setattr(cpa, name, np.array(state[name]))
+        cpa.n_traces = int(cpa.n_traces)
+        cpa.n_samples = len(cpa.sum_t)
+        return cpa
+
+    def correlation(self, byte, table=HW_SBOX):
+        """ (256, S) correlation of every key guess for one byte, where table[k, p] is the hypothetical
+        power for guess k and plaintext byte p. """
+        n = self.n_traces
+        table = np.asarray(table, dtype=np.float64)
+        counts = self.class_counts[byte]
+        sum_h = table @ counts
+        sum_hh = (table * table) @ counts
+        covariance = table @ self.class_sums[byte] - np.outer(sum_h, self.sum_t) / n
+        var_h = sum_hh - sum_h * sum_h / n
+        var_t = self.sum_tt - self.sum_t * self.sum_t / n
+        denominator = np.sqrt(np.outer(np.clip(var_h, 0, None), np.clip(var_t, 0, None)))
+        denominator[denominator == 0] = np.inf
+        return covariance / denominator
+
+    def max_correlations(self, table=HW_SBOX):
+        """ (16, 256) absolute maximum correlation over the samples for every byte and key guess. """
+        return np.stack([np.abs(self.correlation(byte, table)).max(axis=1) for byte in range(self.n_bytes)])
+
+
+class EarlyStopping:
+    """ Tracks when each byte's best guess has been stable and separated from the runner-up.
+
+    A chunk counts towards a byte's streak when its best guess is unchanged from the previous chunk and
+    beats the second best by at least the separation factor. The run can stop once every byte has a
+    streak of patience chunks; the traces needed for a byte is the trace count where its streak began. """
+
+    def __init__(self, n_bytes, patience, separation=1.1):
+        self.patience = patience
+        self.separation = separation
+        self.best = np.full(n_bytes, -1)
+        self.streak = np.zeros(n_bytes, dtype=int)
+        self.streak_start = np.zeros(n_bytes, dtype=int)
+
+    def update(self, max_correlations, n_traces):
+        ranked = np.sort(max_correlations, axis=1)
+        best = np.argmax(max_correlations, axis=1)
+        separated = ranked[:, -1] >= self.separation * ranked[:, -2]
+        started = separated & ((best != self.best) | (self.streak == 0))
+        continued = separated & (best == self.best) & (self.streak > 0)
+        self.streak = np.where(continued, self.streak + 1, np.where(started, 1, 0))
+        self.streak_start = np.where(started, n_traces, self.streak_start)
+        self.best = best
+
+    def stable(self):
+        return self.streak >= self.patience
+
+    def done(self):
+        return bool(self.stable().all())
+
+    def traces_needed(self):
+        """ Traces each byte needed, or None for bytes that never settled. """
+        return [int(start) if stable else None for start, stable in zip(self.streak_start, self.stable())]
+
+
+def run_streaming(chunks, patience=None, separation=1.1, table=HW_SBOX, progress=None, cpa=None, checkpoint=None):
+    """ Feed (plaintext, ciphertext, samples) chunks into an IncrementalCPA, optionally stopping early.
+    progress, if given, is called with the trace count after every chunk and checkpoint with the
+    accumulator and the chunk. Pass cpa to continue a resumed accumulator. Returns the accumulator and the
+    EarlyStopping tracker (None when patience is not set). """
+    if cpa is None:
+        cpa = IncrementalCPA()
+    stopping = None
+    for plaintext, ciphertext, samples in chunks:
+        cpa.update(plaintext, samples)
+        if progress:
+            progress(cpa.n_traces)
+        if checkpoint:
+            checkpoint(cpa, (plaintext, ciphertext, samples))
+        if patience:
+            if stopping is None:
+                stopping = EarlyStopping(cpa.n_bytes, patience, separation)
+            stopping.update(cpa.max_correlations(table), cpa.n_traces)
+            if stopping.done():
+                break
+    return cpa, stopping
@@ -0,0 +1,166 @@
+import argparse
+import io
+import time
+
+import numpy as np
+
+from aes import SBOX, encrypt, expand_key
+from lastround import last_round_key
+from leakage import HW_TABLE, MODELS, get_model, last_round_hypotheses
+from traces import BLOCK_BYTES, create_trace_file
+
+
+class SyntheticAES:
+    """ AES-128 power traces with a known key.
+
+    Every trace is a fixed random 'program' waveform plus, for each key byte, the first-round leakage
+    model value spread over a short pulse at that byte's sample position, plus Gaussian noise. snr is
+    the variance of the leakage over the noise variance. With jitter each trace is shifted by a random
+    lag of up to jitter samples; with last_round the round 10 Hamming distance of each ciphertext byte
+    leaks too, in the second half of the trace. With masked every S-box output is Boolean masked by a
+    fresh random byte: HW(mask) leaks mask_distance samples before HW(Sbox[p ^ k] ^ mask) and neither
+    alone correlates with the key, as in a first-order masked implementation (model is then unused).
+    Ciphertexts are real encryptions of the plaintexts. """
+
+    def __init__(self, n_samples=2500, model='hw_sbox', snr=1.0, jitter=0, last_round=False, masked=False,
+                 mask_distance=10, pulse=5, key=None, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.n_samples = n_samples
+        self.model = model
+        self.table = get_model(model)
+        self.jitter = jitter
+        self.last_round = last_round
+        self.masked = masked
+        self.mask_distance = mask_distance
+        self.key = self.rng.integers(0, 256, BLOCK_BYTES, dtype=np.uint8) if key is None else \
+            np.asarray(key, dtype=np.uint8)
+        self.round_keys = expand_key(self.key)
+        self.pulse = np.hanning(pulse + 2)[1:-1]
+        # Byte positions cover the first half of the trace (and the second half for the last round)
+        span = n_samples // 2 if last_round else n_samples
+        margin = max(len(self.pulse) + (mask_distance if masked else 0), span // 20)
+        self.positions = np.linspace(margin, span - margin - len(self.pulse), BLOCK_BYTES).astype(int)
+        self.last_positions = self.positions + span
+        signal = self.table[self.key, :].std(axis=1).mean()
+        self.noise = signal / np.sqrt(snr)
+        # Program activity an order of magnitude above the leakage, smooth enough to align on
+        program = self.rng.normal(0, 10 * signal, n_samples + 2 * jitter)
+        self.program = np.convolve(program, np.ones(8) / 8, mode='same')
+
+    def chunk(self, n_traces):
+        """ (plaintext, ciphertext, samples) for n_traces new traces, samples as float32. """
+        plaintext = self.rng.integers(0, 256, (n_traces, BLOCK_BYTES), dtype=np.uint8)
+        ciphertext = encrypt(np.broadcast_to(self.round_keys, (n_traces,) + self.round_keys.shape[1:]), plaintext)
+        clean = np.tile(self.program, (n_traces, 1))
+        width = len(self.pulse)
+        for byte in range(BLOCK_BYTES):
+            at = self.jitter + self.positions[byte]
+            if self.masked:
+                mask = self.rng.integers(0, 256, n_traces, dtype=np.uint8)
+                masked = SBOX[plaintext[:, byte] ^ self.key[byte]] ^ mask
+                clean[:, at - self.mask_distance:at - self.mask_distance + width] += \
+                    HW_TABLE[mask][:, None] * self.pulse
+                clean[:, at:at + width] += HW_TABLE[masked][:, None] * self.pulse
+                continue
+            clean[:, at:at + width] += self.table[self.key[byte], plaintext[:, byte]][:, None] * self.pulse
+        if self.last_round:
+            roundKey = last_round_key(self.key)
+            for byte in range(BLOCK_BYTES):
+                at = self.jitter + self.last_positions[byte]
+                clean[:, at:at + width] += last_round_hypotheses(ciphertext, byte)[roundKey[byte]][:, None] * self.pulse
+        if self.jitter:
+            shift = self.rng.integers(-self.jitter, self.jitter + 1, n_traces)
+            index = self.jitter + np.arange(self.n_samples)[None, :] + shift[:, None]
+            clean = np.take_along_axis(clean, index, axis=1)
+        samples = clean + self.rng.normal(0, self.noise, clean.shape)
+        return plaintext, ciphertext, samples.astype(np.float32)
+
+    def chunks(self, n_traces, chunk_size=10000):
+        for begin in range(0, n_traces, chunk_size):
+            yield self.chunk(min(chunk_size, n_traces - begin))
+
+
+def capture(n_traces, chunk_size=10000, **params):
+    """ Generate n_traces in memory. Keyword arguments go to SyntheticAES; returns the generator (for its
+    key) and the (plaintext, ciphertext, samples) arrays. """
+    synthetic = SyntheticAES(**params)
+    plaintext, ciphertext, samples = (np.concatenate(parts) for parts in zip(*synthetic.chunks(n_traces, chunk_size)))
+    return synthetic, plaintext, ciphertext, samples
+
+
+def write_csv(path, chunks):
+    """ Stream chunks into the waveform.csv layout: plaintext and ciphertext as hex, then the samples. """
+    with open(path, 'w') as waveform:
+        for plaintext, ciphertext, samples in chunks:
+            # savetxt formats the floats several times faster than DataFrame.to_csv with a float_format
+            body = io.StringIO()
+            np.savetxt(body, samples, fmt='%.4f', delimiter=',')
+            rows = body.getvalue().splitlines()
+            waveform.writelines(pt.tobytes().hex().upper() + "," + ct.tobytes().hex().upper() + "," + row + "\n"
+                                for pt, ct, row in zip(plaintext, ciphertext, rows))
+
+
+def write_trace_file(path, n_traces, n_samples, chunks):
+    """ Stream chunks into a new binary trace file. """
+    out_plaintext, out_ciphertext, out_samples = create_trace_file(path, n_traces, n_samples)
+    begin = 0
+    for plaintext, ciphertext, samples in chunks:
+        end = begin + len(samples)
+        out_plaintext[begin:end] = plaintext
+        out_ciphertext[begin:end] = ciphertext
+        out_samples[begin:end] = samples
+        begin = end
+    for section in (out_plaintext, out_ciphertext, out_samples):
+        section.flush()
+
+
+def write_key(path, key):
+    """ Ground-truth key in the key.txt format. """
+    with open(path, 'w') as keyFile:
+        keyFile.write("".join(hex(k) + " " for k in key))
+
+
+def generate(path, n_traces, chunk_size=10000, **params):
+    """ Write n_traces synthetic traces to path (CSV if it ends in .csv, else a binary trace file) and the
+    key to <path>.key. Keyword arguments go to SyntheticAES. Returns the generator. """
+    synthetic = SyntheticAES(**params)
+    chunks = synthetic.chunks(n_traces, chunk_size)
+    if path.endswith('.csv'):
+        write_csv(path, chunks)
+    else:
+        write_trace_file(path, n_traces, synthetic.n_samples, chunks)
+    write_key(path + '.key', synthetic.key)
+    return synthetic
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic AES-128 power traces with a known key.")
+    parser.add_argument("output", help="Output path: .csv for the waveform layout, anything else for a trace file.")
+    parser.add_argument("-n", "--traces", type=int, default=100000)
+    parser.add_argument("-s", "--samples", type=int, default=2500)
+    parser.add_argument("--model", choices=list(MODELS), default='hw_sbox', help="First-round leakage model.")
+    parser.add_argument("--snr", type=float, default=1.0, help="Leakage variance over noise variance.")
+    parser.add_argument("--jitter", type=int, default=0, help="Largest random shift of a trace in samples.")
+    parser.add_argument("--last-round", action="store_true", help="Also leak the round 10 Hamming distance.")
+    parser.add_argument("--masked", action="store_true",
+                        help="Boolean mask every S-box output; only a second-order attack recovers the key.")
+    parser.add_argument("--mask-distance", type=int, default=10,
+                        help="Samples between the mask leakage and the masked S-box output leakage.")
+    parser.add_argument("--key", help="Key as 32 hex characters (default random).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Traces generated at a time.")
+    args = parser.parse_args()
+
+    key = None if args.key is None else np.frombuffer(bytes.fromhex(args.key), dtype=np.uint8)
+    start = time.perf_counter()
+    synthetic = generate(args.output, args.traces, args.chunk_size, n_samples=args.samples, model=args.model,
+                         snr=args.snr, jitter=args.jitter, last_round=args.last_round, masked=args.masked,
+                         mask_distance=args.mask_distance, key=key, seed=args.seed)
+    elapsed = time.perf_counter() - start
+    print("Wrote {traces} traces x {samples} samples to {path} in {seconds:.1f}s ({rate:.0f} traces/s)".format(
+        traces=args.traces, samples=args.samples, path=args.output, seconds=elapsed, rate=args.traces / elapsed))
+    print("Key " + " ".join(hex(k) for k in synthetic.key) + " written to " + args.output + ".key")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import argparse
+import struct
+
+import numpy as np
+import pandas as pd
+
+BLOCK_BYTES = 16
+
+
+def hex_to_bytes(hex_strings):
+    """ Convert equal-length hex strings (one per trace) into an (N, len/2) uint8 array. """
+    hex_strings = [value.strip() for value in hex_strings]
+    return np.frombuffer(bytes.fromhex(''.join(hex_strings)), dtype=np.uint8).reshape(len(hex_strings), -1)
+
+
+def split_waveform_frame(waveform_file):
+    """ Split rows of the waveform layout into plaintext, ciphertext and sample arrays. """
+    plaintext = hex_to_bytes(waveform_file.iloc[:, 0])
+    ciphertext = hex_to_bytes(waveform_file.iloc[:, 1])
+    samples = waveform_file.iloc[:, 2:]
+    # A trailing comma on each row shows up as an empty last column
+    if samples.iloc[:, -1].isna().all():
+        samples = samples.iloc[:, :-1]
+    return plaintext, ciphertext, samples.to_numpy(dtype=np.float64)
+
+
+def read_waveform_csv(path):
+    """ Read a waveform file laid out as plaintext hex, ciphertext hex, then one column per power sample.
+    Returns the plaintext and ciphertext as (N, 16) uint8 arrays and the samples as an (N, S) float64 array. """
+    return split_waveform_frame(pd.read_csv(path, index_col=None, header=None))
+
+
+def iter_waveform_csv(path, chunk_size, start=0):
+    """ Yield (plaintext, ciphertext, samples) for consecutive chunks of at most chunk_size traces,
+    so the whole waveform file never has to fit in memory. The first `start` traces are skipped. """
+    with open(path, 'rb') as waveform:
+        # Skipping raw lines is several times faster than read_csv's skiprows
+        for _ in range(start):
+            if not waveform.readline():
+                return
+        try:
+            reader = pd.read_csv(waveform, index_col=None, header=None, chunksize=chunk_size)
+        except pd.errors.EmptyDataError:
+            return
+        for waveform_file in reader:
+            yield split_waveform_frame(waveform_file)
+
+
+#=================================Binary Trace Store=========================================
+# A single file laid out for memory mapping:
+#   64-byte header | plaintext (N, 16) uint8 | ciphertext (N, 16) uint8 | samples (N, S) float32 or int8
+# Each section starts on a 64-byte boundary and samples are trace-major, so a chunk of traces is contiguous.
+# int8 samples are stored quantized and read back as sample * scale + offset.
+
+TRACE_MAGIC = b'CPATRACE'
+TRACE_VERSION = 1
+HEADER_FORMAT = '<8sHBxQQdd'
+HEADER_SIZE = 64
+SECTION_ALIGNMENT = 64
+SAMPLE_DTYPES = {'float32': (0, np.float32), 'int8': (1, np.int8)}
+SAMPLE_DTYPE_NAMES = {code: name for name, (code, dtype) in SAMPLE_DTYPES.items()}
+
+
+def _align(offset):
+    return -(-offset // SECTION_ALIGNMENT) * SECTION_ALIGNMENT
+
+
+def _section_offsets(n_traces):
+    plaintext_offset = HEADER_SIZE
+    ciphertext_offset = _align(plaintext_offset + n_traces * BLOCK_BYTES)
+    samples_offset = _align(ciphertext_offset + n_traces * BLOCK_BYTES)
+    return plaintext_offset, ciphertext_offset, samples_offset
+
+
+def is_trace_file(path):
+    """ True when path starts with the binary trace store magic. """
+    with open(path, 'rb') as trace_file:
+        return trace_file.read(len(TRACE_MAGIC)) == TRACE_MAGIC
+
+
+class TraceFile:
+    """ Read-only view of a binary trace store; plaintext, ciphertext and the raw samples are memmaps. """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as trace_file:
+            header = trace_file.read(struct.calcsize(HEADER_FORMAT))
+        magic, version, dtype_code, self.n_traces, self.n_samples, self.scale, self.offset = \
+            struct.unpack(HEADER_FORMAT, header)
+        if magic != TRACE_MAGIC or version != TRACE_VERSION:
+            raise ValueError(f"{path} is not a version {TRACE_VERSION} trace file.")
+        self.sample_dtype = SAMPLE_DTYPE_NAMES[dtype_code]
+        plaintext_offset, ciphertext_offset, samples_offset = _section_offsets(self.n_traces)
+        shape = (self.n_traces, BLOCK_BYTES)
+        self.plaintext = np.memmap(path, dtype=np.uint8, mode='r', offset=plaintext_offset, shape=shape)
+        self.ciphertext = np.memmap(path, dtype=np.uint8, mode='r', offset=ciphertext_offset, shape=shape)
+        self.raw_samples = np.memmap(path, dtype=SAMPLE_DTYPES[self.sample_dtype][1], mode='r',
+                                     offset=samples_offset, shape=(self.n_traces, self.n_samples))
+
+    def samples(self, start=0, stop=None):
+        """ Samples of traces start..stop as float32 (a memmap slice when stored as float32). """
+        raw = self.raw_samples[start:stop]
+        if self.sample_dtype == 'float32':
+            return raw
+        return raw.astype(np.float32) * np.float32(self.scale) + np.float32(self.offset)
+
+    def iter_chunks(self, chunk_size, start=0):
+        for begin in range(start, self.n_traces, chunk_size):
+            end = min(begin + chunk_size, self.n_traces)
+            yield self.plaintext[begin:end], self.ciphertext[begin:end], self.samples(begin, end)
+
+
+def create_trace_file(path, n_traces, n_samples, sample_dtype='float32', scale=1.0, offset=0.0):
+    """ Allocate a trace store and return writable (plaintext, ciphertext, raw samples) memmaps. """
+    dtype_code, dtype = SAMPLE_DTYPES[sample_dtype]
+    plaintext_offset, ciphertext_offset, samples_offset = _section_offsets(n_traces)
+    with open(path, 'wb') as trace_file:
+        header = struct.pack(HEADER_FORMAT, TRACE_MAGIC, TRACE_VERSION, dtype_code, n_traces, n_samples,
+                             scale, offset)
+        trace_file.write(header.ljust(HEADER_SIZE, b'\0'))
+        trace_file.truncate(samples_offset + n_traces * n_samples * np.dtype(dtype).itemsize)
+    shape = (n_traces, BLOCK_BYTES)
+    return (np.memmap(path, dtype=np.uint8, mode='r+', offset=plaintext_offset, shape=shape),
+            np.memmap(path, dtype=np.uint8, mode='r+', offset=ciphertext_offset, shape=shape),
+            np.memmap(path, dtype=dtype, mode='r+', offset=samples_offset, shape=(n_traces, n_samples)))
+
+
+def quantize(samples, scale, offset):
+    """ Map float samples onto int8 so that sample ~= q * scale + offset. """
+    return np.clip(np.rint((samples - offset) / scale), -128, 127).astype(np.int8)
+
+
+def convert_csv(csv_path, trace_path, sample_dtype='float32', chunk_size=10000):
+    """ Stream a waveform CSV into a binary trace store. A first pass counts the traces (and finds the
+    sample range for int8), a second pass fills the memory-mapped sections chunk by chunk. """
+    n_traces, n_samples = 0, None
+    low, high = np.inf, -np.inf
+    for plaintext, ciphertext, samples in iter_waveform_csv(csv_path, chunk_size):
+        n_traces += len(samples)
+        n_samples = samples.shape[1]
+        if sample_dtype == 'int8':
+            low, high = min(low, samples.min()), max(high, samples.max())
+    scale, offset = 1.0, 0.0
+    if sample_dtype == 'int8':
+        offset = (high + low) / 2
+        scale = (high - low) / 254 or 1.0
+    out_plaintext, out_ciphertext, out_samples = create_trace_file(
+        trace_path, n_traces, n_samples, sample_dtype, scale, offset)
+    begin = 0
+    for plaintext, ciphertext, samples in iter_waveform_csv(csv_path, chunk_size):
+        end = begin + len(samples)
+        out_plaintext[begin:end] = plaintext
+        out_ciphertext[begin:end] = ciphertext
+        out_samples[begin:end] = quantize(samples, scale, offset) if sample_dtype == 'int8' else samples
+        begin = end
+    for section in (out_plaintext, out_ciphertext, out_samples):
+        section.flush()
+    return n_traces, n_samples
+
+
+def load_traces(path):
+    """ Load a waveform CSV or binary trace store as (plaintext, ciphertext, samples). Binary stores are
+    memory mapped rather than read. """
+    if is_trace_file(path):
+        traces = TraceFile(path)
+        return traces.plaintext, traces.ciphertext, traces.samples()
+    return read_waveform_csv(path)
+
+
+def iter_traces(path, chunk_size, start=0):
+    """ Yield (plaintext, ciphertext, samples) chunks from either format, from trace `start` on. """
+    if is_trace_file(path):
+        return TraceFile(path).iter_chunks(chunk_size, start)
+    return iter_waveform_csv(path, chunk_size, start)
+
+
+def trace_count(path, chunk_size=10000):
+    """ Number of traces in either format; a CSV is counted with one streaming pass. """
+    if is_trace_file(path):
+        return TraceFile(path).n_traces
+    return sum(len(samples) for plaintext, ciphertext, samples in iter_waveform_csv(path, chunk_size))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a waveform CSV into a binary trace store.")
+    parser.add_argument("waveform", help="Waveform CSV: plaintext, ciphertext, then the power samples.")
+    parser.add_argument("output", help="Binary trace file to write.")
+    parser.add_argument("--dtype", choices=list(SAMPLE_DTYPES), default='float32', help="Sample storage type.")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Traces converted at a time.")
+    args = parser.parse_args()
+    n_traces, n_samples = convert_csv(args.waveform, args.output, args.dtype, args.chunk_size)
+    print("Wrote {traces} traces x {samples} samples to {path}".format(
+        traces=n_traces, samples=n_samples, path=args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import argparse
+import os
+import resource
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import settlement
+
+# Synthetic journals start on 2024-05-01 00:00 local time
+START_EPOCH = 1714521600
+
+
+def generate_journal(path, records, cards, seed=0, block=1_000_000):
+    """ Stream a synthetic host journal of roughly `records` tap records to path. Each hour every card makes
+    at most one journey; a few tap ins are dropped (penalties) or tap outs lost (open/double debits). """
+    rng = np.random.default_rng(seed)
+    max_fare, used_fare, refund, penalty = settlement.build_fare_tables()
+    stations = np.array(settlement.STATION_NAMES)
+    written = 0
+    clock = START_EPOCH
+    with open(path, 'w') as journal:
+        journal.write("card_id,action,value,station,timestamp\n")
+        while written < records:
+            trips = min(block // 2, cards, (records - written) // 2 + 1)
+            card = rng.choice(cards, trips, replace=False)
+            origin = rng.integers(0, settlement.N_STATIONS, trips)
+            dest = rng.integers(0, settlement.N_STATIONS, trips)
+            tap_in_time = clock + np.sort(rng.integers(0, 1800, trips))
+            tap_out_time = tap_in_time + rng.integers(300, 1800, trips)
+            clock += 3600
+
+            keep_in = rng.random(trips) > 0.02
+            keep_out = rng.random(trips) > 0.02
+            card_id = np.char.add('C', card.astype(str))
+            rows = pd.concat([
+                pd.DataFrame({'card_id': card_id, 'action': 'tap in', 'value': max_fare[origin],
+                              'station': stations[origin], 'timestamp': tap_in_time})[keep_in],
+                pd.DataFrame({'card_id': card_id, 'action': 'tap out',
+                              'value': np.where(keep_in, refund[origin, dest], 0),
+                              'station': stations[dest], 'timestamp': tap_out_time})[keep_out],
+            ])
+            rows = rows.sort_values('timestamp', kind='stable')
+            rows.to_csv(journal, header=False, index=False)
+            written += len(rows)
+    return written
+
+
+def reference_settlement(path):
+    """ Plain Python settlement used to check the vectorised engine on small journals. """
+    max_fare, used_fare, refund, penalty = settlement.build_fare_tables()
+    open_tap_in = {}
+    totals = dict.fromkeys(settlement.STATION_COLUMNS, 0)
+    totals['rejected'] = 0
+    trips = {}
+    journal = pd.read_csv(path, dtype={'card_id': str, 'action': str, 'station': str})
+    for card, action, value, station, timestamp in journal.itertuples(index=False):
+        action = settlement.ACTION_CODES.get(str(action).strip().lower())
+        station = settlement.STATION_CODES.get(str(station).strip().lower())
+        if action is None or station is None or pd.isna(card) or pd.isna(value) or pd.isna(timestamp):
+            totals['rejected'] += 1
+            continue
+        value = int(value)
+        if action == settlement.ACTION_TAP_IN:
+            totals['tap_ins'] += 1
+            totals['fares_collected'] += value
+            if card in open_tap_in:
+                totals['double_debits'] += 1
+            open_tap_in[card] = (station, value)
+        else:
+            totals['tap_outs'] += 1
+            if card in open_tap_in:
+                origin, fare = open_tap_in.pop(card)
+                totals['refunds'] += value
+                totals['refund_mismatches'] += int(value != refund[origin, station])
+                trips[(origin, station)] = trips.get((origin, station), 0) + fare - value
+            else:
+                totals['penalties'] += 1
+                totals['penalty_revenue'] += int(penalty[station])
+    totals['open_tap_ins'] = len(open_tap_in)
+    return totals, trips
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the settlement engine on a synthetic journal.")
+    parser.add_argument("-n", "--records", type=int, default=20_000_000, help="Number of tap records.")
+    parser.add_argument("--cards", type=int, default=2_000_000, help="Number of distinct cards.")
+    parser.add_argument("-c", "--chunk-size", type=int, default=settlement.DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--journal", help="Reuse or keep the synthetic journal at this path.")
+    parser.add_argument("--verify", action="store_true",
+                        help="Check against the plain Python settlement. Run it with --journal "
+                             "settlement_fixture.csv to cover malformed rows.")
+    args = parser.parse_args()
+
+    if args.journal:
+        run_benchmark(args.journal, args)
+        return
+    with tempfile.TemporaryDirectory() as workdir:
+        run_benchmark(os.path.join(workdir, "journal.csv"), args)
+
+
+def run_benchmark(path, args):
+    if not os.path.exists(path):
+        start = time.perf_counter()
+        written = generate_journal(path, args.records, args.cards)
+        print(f"Generated {written} records ({os.path.getsize(path) / 2**20:.0f} MiB) "
+              f"in {time.perf_counter() - start:.1f}s")
+
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    result = settlement.settle([path], 'journal', args.chunk_size)
+    elapsed = time.perf_counter() - start
+    totals = result.totals()
+    print(f"Settled {totals['records']} records in {elapsed:.2f}s "
+          f"({totals['records'] / elapsed / 1e6:.2f} M records/s), peak RSS {peak_rss_mb():.0f} MiB "
+          f"(before run {rss_before:.0f} MiB)")
+
+    if args.verify:
+        expected, trips = reference_settlement(path)
+        od = result.od_frame().groupby(['origin', 'destination'])['fare_revenue'].sum()
+        od_expected = {(settlement.STATION_NAMES[o], settlement.STATION_NAMES[d]): v for (o, d), v in trips.items()}
+        matches = all(totals[k] == v for k, v in expected.items()) and od.to_dict() == od_expected
+        print("Reference check: " + ("OK" if matches else f"MISMATCH {expected} != {totals}"))
+
+
+if __name__ == "__main__":
+    main()
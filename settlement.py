@@ -0,0 +1,323 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+# Fare tables as used by card.py. card.py connects to a reader and parses its own
+# arguments on import, so the tables are repeated here for offline settlement.
+STATION_NAMES = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H']
+MAX_FARE_LOOKUP = {'A': 680, 'B': 590, 'C': 510, 'D': 480, 'E': 380, 'F': 420, 'G': 570, 'H': 680}
+FARE_LOOKUP = {'A': 90, 'B': 80, 'C': 30, 'D': 100, 'E': 120, 'F': 150, 'G': 110, 'H': 0}
+REVERSE_FARE_LOOKUP = {'H': 110, 'G': 150, 'F': 120, 'E': 100, 'D': 30, 'C': 80, 'B': 90, 'A': 0}
+
+N_STATIONS = len(STATION_NAMES)
+SECONDS_PER_DAY = 86400
+DEFAULT_CHUNK_SIZE = 1_000_000
+
+# Block 9 action byte written by write_transaction_history
+ACTION_TAP_IN = 0x00
+ACTION_TAP_OUT = 0x01
+ACTION_CODES = {'tap in': ACTION_TAP_IN, '0': ACTION_TAP_IN, 'tap out': ACTION_TAP_OUT, '1': ACTION_TAP_OUT}
+STATION_CODES = {name.lower(): index for index, name in enumerate(STATION_NAMES)}
+
+STATION_COLUMNS = ['tap_ins', 'fares_collected', 'tap_outs', 'refunds', 'refund_mismatches', 'penalties',
+                   'penalty_revenue', 'double_debits', 'open_tap_ins']
+OD_COLUMNS = ['trips', 'fare_revenue', 'refunds', 'refund_mismatches']
+
+
+def find_used_fare(source_station, dest_station):
+    """ Gets and return the fare value used based on source to destination stations. """
+    fare = 0
+    if source_station == dest_station:
+        return MAX_FARE_LOOKUP[source_station]
+    if source_station < dest_station:
+        stations = list(FARE_LOOKUP)
+        lookup = FARE_LOOKUP
+    else:
+        stations = list(REVERSE_FARE_LOOKUP)
+        lookup = REVERSE_FARE_LOOKUP
+    source_index = stations.index(source_station)
+    dest_index = stations.index(dest_station)
+    for station in stations[source_index: dest_index]:
+        fare += lookup[station]
+    return fare
+
+
+def build_fare_tables():
+    """ Return the max fare per station, the used fare and refund per origin/destination and the
+    penalty charged for a tap out without tap in, all indexed by station number. refund[o, d] is what
+    card.py's tap_out_fare_refund_value credits for that journey. """
+    max_fare = np.array([MAX_FARE_LOOKUP[s] for s in STATION_NAMES], dtype=np.int64)
+    used_fare = np.array([[find_used_fare(o, d) for d in STATION_NAMES] for o in STATION_NAMES], dtype=np.int64)
+    refund = max_fare[:, None] - used_fare
+    # card.py debits int(max_fare / 100) * 100 cents when no tap in is found
+    penalty = (max_fare // 100) * 100
+    return max_fare, used_fare, refund, penalty
+
+
+def _tally(day, index, weights, size):
+    """ Sum weights per (day, index) and return the unique days with a (days, size) table. """
+    if len(day) == 0:
+        return day, np.zeros((0, size))
+    unique_days, day_index = np.unique(day, return_inverse=True)
+    flat = day_index * size + index
+    table = np.bincount(flat, weights=weights, minlength=len(unique_days) * size)
+    return unique_days, table.reshape(len(unique_days), size)
+
+
+class Settlement:
+    """ Streaming aggregator pairing tap in with tap out per card.
+
+    Records must arrive in time order per card. Tap ins still open at the end of a chunk are carried
+    into the next one, so memory is bounded by the chunk size plus the number of cards mid-journey.
+    Refunds are summed as recorded; those that differ from the fare table are counted as refund_mismatches. """
+
+    def __init__(self):
+        _, _, self.refund, self.penalty = build_fare_tables()
+        self.station_days = {}
+        self.od_days = {}
+        self.records = 0
+        self.rejected = 0
+        self._carry = self._empty_carry()
+
+    @staticmethod
+    def _empty_carry():
+        return {'card': np.empty(0, dtype=object), 'value': np.empty(0, dtype=np.int64),
+                'station': np.empty(0, dtype=np.int64), 'day': np.empty(0, dtype=np.int64)}
+
+    def _add(self, target, day, index, weights, size, columns, column):
+        days, table = _tally(day, index, weights, size)
+        for row, d in enumerate(days.tolist()):
+            if d not in target:
+                target[d] = np.zeros((size, len(columns)), dtype=np.int64)
+            target[d][:, column] += table[row].astype(np.int64)
+
+    def _add_station(self, column, day, station, weights=None):
+        self._add(self.station_days, day, station, weights, N_STATIONS, STATION_COLUMNS,
+                  STATION_COLUMNS.index(column))
+
+    def _add_od(self, column, day, origin, dest, weights=None):
+        self._add(self.od_days, day, origin * N_STATIONS + dest, weights, N_STATIONS * N_STATIONS, OD_COLUMNS,
+                  OD_COLUMNS.index(column))
+
+    def add_chunk(self, card, action, value, station, timestamp):
+        """ Aggregate one chunk of tap records given as equal-length arrays. """
+        card = np.asarray(card, dtype=object)
+        action = np.asarray(action, dtype=np.int64)
+        value = np.asarray(value, dtype=np.int64)
+        station = np.asarray(station, dtype=np.int64)
+        day = np.asarray(timestamp, dtype=np.int64) // SECONDS_PER_DAY
+
+        # Records without a card would all be grouped as one card, so they are rejected like bad actions
+        valid = (pd.notna(card) & (station >= 0) & (station < N_STATIONS) &
+                 ((action == ACTION_TAP_IN) | (action == ACTION_TAP_OUT)))
+        self.records += len(card)
+        self.rejected += int((~valid).sum())
+
+        carry = self._carry
+        n_carry = len(carry['card'])
+        card = np.concatenate([carry['card'], card[valid]])
+        is_out = np.concatenate([np.zeros(n_carry, dtype=bool), action[valid] == ACTION_TAP_OUT])
+        value = np.concatenate([carry['value'], value[valid]])
+        station = np.concatenate([carry['station'], station[valid]])
+        day = np.concatenate([carry['day'], day[valid]])
+        carried = np.zeros(len(card), dtype=bool)
+        carried[:n_carry] = True
+
+        # Group records by card while keeping arrival order (carried tap ins come first)
+        codes, _ = pd.factorize(card)
+        order = np.argsort(codes, kind='stable')
+        codes, card, is_out, value, station, day, carried = (
+            codes[order], card[order], is_out[order], value[order], station[order], day[order], carried[order])
+
+        same_prev = np.r_[False, codes[1:] == codes[:-1]]
+        same_next = np.r_[same_prev[1:], False]
+        prev_in = same_prev & np.r_[False, ~is_out[:-1]]
+        next_in = same_next & np.r_[~is_out[1:], False]
+
+        tap_in = ~is_out & ~carried
+        self._add_station('tap_ins', day[tap_in], station[tap_in])
+        self._add_station('fares_collected', day[tap_in], station[tap_in], value[tap_in])
+
+        self._add_station('tap_outs', day[is_out], station[is_out])
+        trip = is_out & prev_in
+        self._add_station('refunds', day[trip], station[trip], value[trip])
+
+        origin = np.r_[0, station[:-1]][trip]
+        fare_in = np.r_[0, value[:-1]][trip]
+        self._add_od('trips', day[trip], origin, station[trip])
+        self._add_od('fare_revenue', day[trip], origin, station[trip], fare_in - value[trip])
+        self._add_od('refunds', day[trip], origin, station[trip], value[trip])
+        mismatch = value[trip] != self.refund[origin, station[trip]]
+        self._add_station('refund_mismatches', day[trip][mismatch], station[trip][mismatch])
+        self._add_od('refund_mismatches', day[trip][mismatch], origin[mismatch], station[trip][mismatch])
+
+        penalty = is_out & ~prev_in
+        self._add_station('penalties', day[penalty], station[penalty])
+        self._add_station('penalty_revenue', day[penalty], station[penalty], self.penalty[station[penalty]])
+
+        # A tap in followed by another tap in keeps the full fare charged
+        double = ~is_out & next_in
+        self._add_station('double_debits', day[double], station[double])
+
+        still_open = ~is_out & ~same_next
+        self._carry = {'card': card[still_open], 'value': value[still_open], 'station': station[still_open],
+                       'day': day[still_open]}
+
+    def finish(self):
+        """ Record tap ins that never saw a tap out as open journeys. """
+        carry = self._carry
+        self._add_station('open_tap_ins', carry['day'], carry['station'])
+        self._carry = self._empty_carry()
+
+    def station_frame(self):
+        """ Per day and station totals, with net revenue after refunds and penalties. """
+        rows = []
+        for d in sorted(self.station_days):
+            frame = pd.DataFrame(self.station_days[d], columns=STATION_COLUMNS)
+            frame.insert(0, 'station', STATION_NAMES)
+            frame.insert(0, 'day', d)
+            rows.append(frame)
+        frame = pd.concat(rows, ignore_index=True) if rows else pd.DataFrame(columns=['day', 'station'] + STATION_COLUMNS)
+        frame['net_revenue'] = frame['fares_collected'] - frame['refunds'] + frame['penalty_revenue']
+        frame['day'] = pd.to_datetime(frame['day'].astype(np.int64), unit='D').dt.date
+        return frame
+
+    def od_frame(self):
+        """ Per day and origin/destination totals, trips counted on their tap out day. """
+        rows = []
+        origin = np.repeat(STATION_NAMES, N_STATIONS)
+        dest = np.tile(STATION_NAMES, N_STATIONS)
+        for d in sorted(self.od_days):
+            frame = pd.DataFrame(self.od_days[d], columns=OD_COLUMNS)
+            frame.insert(0, 'destination', dest)
+            frame.insert(0, 'origin', origin)
+            frame.insert(0, 'day', d)
+            rows.append(frame[frame['trips'] > 0])
+        frame = pd.concat(rows, ignore_index=True) if rows else pd.DataFrame(columns=['day', 'origin', 'destination'] + OD_COLUMNS)
+        frame['day'] = pd.to_datetime(frame['day'].astype(np.int64), unit='D').dt.date
+        return frame
+
+    def totals(self):
+        """ Run-wide totals for quick reconciliation. """
+        stations = sum(self.station_days.values(), np.zeros((N_STATIONS, len(STATION_COLUMNS)), dtype=np.int64))
+        totals = dict(zip(STATION_COLUMNS, stations.sum(axis=0).tolist()))
+        totals['net_revenue'] = totals['fares_collected'] - totals['refunds'] + totals['penalty_revenue']
+        totals['records'] = self.records
+        totals['rejected'] = self.rejected
+        return totals
+
+
+def _category_codes(column, mapping):
+    """ Map a categorical column through a {category: code} dict, anything unknown to -1. """
+    lookup = np.array([mapping.get(str(c).strip().lower(), -1) for c in column.cat.categories] + [-1], dtype=np.int64)
+    # Missing values have category code -1, which picks the trailing -1
+    return lookup[column.cat.codes.to_numpy()]
+
+
+def iter_journal(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """ Yield (card, action, value, station, timestamp) arrays from a host journal CSV with the columns
+    card_id, action, value, station, timestamp. Action is 'tap in'/'tap out' or the block 9 code 0/1.
+    Rows with an empty card_id, value or timestamp get action -1 so the settlement rejects them. """
+    reader = pd.read_csv(path, chunksize=chunk_size,
+                         dtype={'card_id': str, 'station': 'category', 'action': 'category'},
+                         usecols=['card_id', 'action', 'value', 'station', 'timestamp'])
+    for chunk in reader:
+        missing = chunk[['card_id', 'value', 'timestamp']].isna().any(axis=1).to_numpy()
+        action = _category_codes(chunk['action'], ACTION_CODES)
+        action[missing] = -1
+        # Empty cells are read as NaN, which must not reach the int64 cast
+        yield (chunk['card_id'].to_numpy(dtype=object), action,
+               chunk['value'].fillna(0).to_numpy(dtype=np.int64), _category_codes(chunk['station'], STATION_CODES),
+               chunk['timestamp'].fillna(0).to_numpy(dtype=np.int64))
+
+
+def decode_transaction_blocks(blocks):
+    """ Decode block 9 hex strings (as returned by send_apdu, spaces optional) into a (n, 16) uint8 array. """
+    text = pd.Series(blocks, dtype=object).str.replace(' ', '', regex=False)
+    if len(text) and not (text.str.len() == 32).all():
+        raise ValueError("Transaction block must be 16 bytes of hex.")
+    raw = np.frombuffer(''.join(text).encode('ascii'), dtype=np.uint8).reshape(-1, 32)
+    nibble = np.full(256, 255, dtype=np.uint8)
+    nibble[np.frombuffer(b'0123456789', dtype=np.uint8)] = np.arange(10)
+    nibble[np.frombuffer(b'abcdef', dtype=np.uint8)] = np.arange(10, 16)
+    nibble[np.frombuffer(b'ABCDEF', dtype=np.uint8)] = np.arange(10, 16)
+    nibbles = nibble[raw]
+    if (nibbles == 255).any():
+        raise ValueError("Transaction block contains non-hex characters.")
+    return (nibbles[:, 0::2] << 4) | nibbles[:, 1::2]
+
+
+def iter_card_dump(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """ Yield tap record arrays from exported card dumps with the columns card_id, block, where block is the
+    16-byte transaction block written by write_transaction_history. """
+    reader = pd.read_csv(path, chunksize=chunk_size, dtype={'card_id': str, 'block': str},
+                         usecols=['card_id', 'block'])
+    for chunk in reader:
+        block = decode_transaction_blocks(chunk['block'].to_numpy())
+        be = block.astype(np.int64)
+        value = (be[:, 1] << 24) | (be[:, 2] << 16) | (be[:, 3] << 8) | be[:, 4]
+        timestamp = (be[:, 6] << 24) | (be[:, 7] << 16) | (be[:, 8] << 8) | be[:, 9]
+        station = be[:, 5] - ord('A')
+        station[(station < 0) | (station >= N_STATIONS)] = -1
+        # An all-zero block is a freshly initialised card
+        action = np.where(block.any(axis=1), be[:, 0], -1)
+        yield chunk['card_id'].to_numpy(dtype=object), action, value, station, timestamp
+
+
+def write_frame(frame, path, output_format):
+    if output_format == 'parquet':
+        try:
+            frame.to_parquet(path, index=False)
+        except ImportError:
+            exit("Parquet output requires pyarrow or fastparquet, please install one or use --format csv.")
+    else:
+        frame.to_csv(path, index=False)
+
+
+def settle(paths, input_format, chunk_size=DEFAULT_CHUNK_SIZE):
+    """ Run the settlement over one or more input files and return the aggregator. """
+    settlement = Settlement()
+    reader = iter_card_dump if input_format == 'dump' else iter_journal
+    for path in paths:
+        for card, action, value, station, timestamp in reader(path, chunk_size):
+            settlement.add_chunk(card, action, value, station, timestamp)
+    settlement.finish()
+    return settlement
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Daily settlement and ridership summaries from tap records.")
+    parser.add_argument("inputs", nargs='+', help="Host journal or card dump CSV files, in time order.")
+    parser.add_argument("-i", "--input-format", choices=['journal', 'dump'], default='journal',
+                        help="journal: card_id,action,value,station,timestamp. dump: card_id,block.")
+    parser.add_argument("-o", "--output-dir", default="settlement", help="Directory for the summaries.")
+    parser.add_argument("-f", "--format", choices=['csv', 'parquet'], default='csv', help="Summary file format.")
+    parser.add_argument("-c", "--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Records per chunk.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    settlement = settle(args.inputs, args.input_format, args.chunk_size)
+    elapsed = time.perf_counter() - start
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    extension = 'parquet' if args.format == 'parquet' else 'csv'
+    write_frame(settlement.station_frame(), os.path.join(args.output_dir, f"station_summary.{extension}"), args.format)
+    write_frame(settlement.od_frame(), os.path.join(args.output_dir, f"od_summary.{extension}"), args.format)
+    totals = settlement.totals()
+    with open(os.path.join(args.output_dir, "totals.json"), 'w') as totals_file:
+        json.dump(totals, totals_file, indent=2)
+
+    print(f"Settled {totals['records']} records in {elapsed:.2f}s ({totals['rejected']} rejected).")
+    print(f"Fares collected: ${totals['fares_collected'] / 100:.2f}, refunds: ${totals['refunds'] / 100:.2f}, "
+          f"penalties: ${totals['penalty_revenue'] / 100:.2f}, net: ${totals['net_revenue'] / 100:.2f}")
+    if totals['refund_mismatches']:
+        print(f"{totals['refund_mismatches']} tap out refunds differ from tap_out_fare_refund_value.")
+
+
+if __name__ == "__main__":
+    sys.exit(main())